@@ -1,21 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request, Response, UploadFile, File, Body
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Header, Request, Response, UploadFile, File, Body
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timezone
 from typing import Dict, Optional, List, Any
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 from sqlalchemy.exc import IntegrityError
 import os
 import csv
-import io
-import pandas as pd
+import math
 import json
 import numpy as np
+import pyarrow as pa
 import base64
 import joblib
 from pathlib import Path
 import sys
 import traceback
-import importlib.util
 
 
 app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -23,41 +27,27 @@ if app_dir not in sys.path:
     sys.path.append(app_dir)
 
 from ..core.auth import create_user, get_user_by_api_key, UserInDB, authenticate_user
-from ..core.database import get_db, TrafficLog, User, Workspace
-
+from ..core.rate_limit import login_limiter, login_keys, register_keys
+from ..core.database import get_async_db, DriftSketch, EvaluationReport, ScoringJob, ScoringJobResult, TrafficLog, TrafficLogRollup, User, Workspace
+from ..core.events import broker, format_sse, HEARTBEAT_INTERVAL
+from ..core import feature_store
+from ..core.uploads import (
+    MIN_ATTACK_PROBABILITY, drift_sketch_values, evaluation_values, option_flag, publish_detections,
+    rows_to_log, build_log_rows, discard_batch, score_upload, upload_plan, upload_response, with_log_ids
+)
+from ..core.retention import purge_deleted
+from ..core.talkers import label_breakdown_query, talker_counts, talker_upsert, top_talkers_query
+from ..core.jobs import DONE, job_status, merge_result, new_job_values, notify_workers
+from drift import current_baseline, drift_report, merge_sketches
+from ..inference import engine as inference
 
 
 try:
-    
-    original_dir = os.getcwd()
-    os.chdir(app_dir)
-    
-    
-    spec = importlib.util.spec_from_file_location("pipeline_manager", os.path.join(app_dir, "pipeline_manager.py"))
-    pipeline_manager = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(pipeline_manager)
-    
-    
-    main_pipeline_path = os.path.join(app_dir, "main_pipeline.pkl")
-    
-    
-    print("Loading pipeline using pipeline_manager...")
-    if not os.path.exists(main_pipeline_path):
-        print(f"Pipeline not found, pipeline_manager will create it")
-        
-    
-    print("Getting main_pipeline from pipeline_manager...")
-    main_pipeline = pipeline_manager.get_pipeline()
-    if main_pipeline:
-        PIPELINE_READY = True
-        print(f"Successfully loaded main pipeline")
-    else:
-        print("Failed to get pipeline from pipeline_manager")
-        PIPELINE_READY = False
-        main_pipeline = None
-        
-    
-    os.chdir(original_dir)
+    # builds the pickles on first run and warms the shared pipeline before the first upload
+    print("Loading main pipeline...")
+    main_pipeline = inference.get_pipeline()
+    PIPELINE_READY = True
+    print(f"Successfully loaded main pipeline")
 except Exception as e:
     print(f"Error loading main pipeline: {str(e)}")
     traceback.print_exc()
@@ -66,6 +56,14 @@ except Exception as e:
 
 router = APIRouter()
 
+# raw columnar uploads, their options come as query parameters
+COLUMNAR_CONTENT_TYPES = {
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/vnd.apache.arrow.file": "arrow",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+
 
 class UserCreate(BaseModel):
     username: str
@@ -103,7 +101,7 @@ class TrafficLogResponse(BaseModel):
 
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[UserInDB]:
     
     api_key = request.cookies.get("api_key")
@@ -120,7 +118,7 @@ async def get_current_user(
 async def create_workspace(
     workspace: WorkspaceCreate,
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> WorkspaceResponse:
     
     if not current_user:
@@ -132,53 +130,75 @@ async def create_workspace(
         user_id=current_user.id
     )
     db.add(db_workspace)
-    db.commit()
-    db.refresh(db_workspace)
+    await db.commit()
+    await db.refresh(db_workspace)
     return db_workspace
 
 @router.get("/workspaces", response_model=List[WorkspaceResponse])
 async def get_workspaces(
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> List[WorkspaceResponse]:
     
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
         
-    workspaces = db.query(Workspace).filter(Workspace.user_id == current_user.id).all()
+    workspaces = (await db.execute(select(Workspace).where(
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().all()
     return workspaces
 
 @router.delete("/workspaces/{workspace_id}")
 async def delete_workspace(
     workspace_id: int,
+    background_tasks: BackgroundTasks,
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Dict[str, str]:
     
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
         
-    workspace = db.query(Workspace).filter(
+    workspace = (await db.execute(select(Workspace).where(
         Workspace.id == workspace_id,
-        Workspace.user_id == current_user.id
-    ).first()
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
     
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
     
-    db.delete(workspace)
-    db.commit()
+    # rows are purged in the background, the workspace disappears immediately
+    workspace.deleted_at = datetime.now(timezone.utc)
+    await db.commit()
+    background_tasks.add_task(purge_deleted)
     return {"message": "Workspace deleted successfully"}
 
 
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+def check_rate_limit(keys):
+    
+    retry_after = login_limiter.acquire(keys)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, try again later",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
 @router.post("/register", response_model=UserInDB)
 async def register_user(
     user: UserCreate,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ) -> UserInDB:
     
+    check_rate_limit(register_keys(client_ip(request)))
     try:
-        return create_user(db, user.username, user.email, user.password)
+        return await create_user(db, user.username, user.email, user.password)
     except IntegrityError as e:
         raise HTTPException(
             status_code=400,
@@ -193,11 +213,14 @@ async def register_user(
 @router.post("/login", response_model=UserInDB)
 async def login(
     user: UserLogin,
-    db: Session = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
 ) -> UserInDB:
     
+    # checked before any bcrypt work, so a login burst costs almost nothing once it is over the limit
+    check_rate_limit(login_keys(user.username, client_ip(request)))
     try:
-        return authenticate_user(db, user.username, user.password)
+        return await authenticate_user(db, user.username, user.password)
     except Exception as e:
         raise HTTPException(
             status_code=401,
@@ -208,7 +231,7 @@ async def login(
 async def get_logs(
     workspace_id: int = Query(..., description="Workspace ID to filter logs"),
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500)
 ) -> List[TrafficLogResponse]:
@@ -217,18 +240,19 @@ async def get_logs(
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     
-    workspace = db.query(Workspace).filter(
+    workspace = (await db.execute(select(Workspace).where(
         Workspace.id == workspace_id,
-        Workspace.user_id == current_user.id
-    ).first()
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found or access denied")
         
     
-    logs = db.query(TrafficLog).filter(
+    logs = (await db.execute(select(TrafficLog).where(
         TrafficLog.user_id == current_user.id,
         TrafficLog.workspace_id == workspace_id
-    ).offset(skip).limit(limit).all()
+    ).offset(skip).limit(limit))).scalars().all()
     
     
     if not logs:
@@ -236,6 +260,30 @@ async def get_logs(
         
     return logs
 
+@router.get("/logs/{log_id}/features")
+async def get_log_features(
+    log_id: int,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Dict[str, Any]:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    log = (await db.execute(select(TrafficLog).where(
+        TrafficLog.id == log_id,
+        TrafficLog.user_id == current_user.id
+    ))).scalars().first()
+    if not log:
+        raise HTTPException(status_code=404, detail="Log not found")
+    
+    if log.batch_id is None:
+        return log.headers or {}
+    try:
+        return feature_store.read_row(log.workspace_id, log.batch_id, log.batch_row)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Flow features are no longer available")
+
 @router.get("/auth/status")
 async def get_auth_status(
     current_user: User = Depends(get_current_user)
@@ -252,35 +300,241 @@ async def get_api_key(
         raise HTTPException(status_code=401, detail="Not authenticated")
     return {"api_key": current_user.api_key}
 
+@router.get("/pipeline/cache")
+async def get_prediction_cache_stats(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return inference.cache_stats()
+
+@router.get("/pipeline/models")
+async def get_model_versions(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await run_in_threadpool(inference.model_versions)
+
+@router.get("/pipeline/shadow")
+async def get_shadow_stats(
+    current_user: User = Depends(get_current_user)
+) -> Dict[str, Any]:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return inference.shadow_stats()
+
+@router.get("/workspaces/{workspace_id}/drift")
+async def get_workspace_drift(
+    workspace_id: int,
+    period: Optional[str] = Query(None, description="Month as YYYYMM, default: everything stored"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> Dict[str, Any]:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    workspace = (await db.execute(select(Workspace).where(
+        Workspace.id == workspace_id,
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
+    
+    baseline = await run_in_threadpool(current_baseline)
+    if baseline is None:
+        raise HTTPException(status_code=503, detail="No drift baseline, create one with create_drift_baseline.py")
+    
+    # sketches were summarised at ingest time, so this never touches the stored flows
+    query = select(DriftSketch.sketch).where(
+        DriftSketch.workspace_id == workspace_id,
+        DriftSketch.baseline == baseline.baseline_id
+    )
+    if period:
+        query = query.where(DriftSketch.period == period)
+    blobs = (await db.execute(query)).scalars().all()
+    await db.close()
+    
+    sketch = await run_in_threadpool(merge_sketches, blobs, baseline)
+    report = await run_in_threadpool(drift_report, baseline, sketch)
+    return {"workspace_id": workspace_id, "period": period, **report}
+
+@router.get("/workspaces/{workspace_id}/evaluations")
+async def get_workspace_evaluations(
+    workspace_id: int,
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> List[Dict[str, Any]]:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    workspace = (await db.execute(select(Workspace).where(
+        Workspace.id == workspace_id,
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
+    
+    reports = (await db.execute(
+        select(EvaluationReport)
+        .where(EvaluationReport.workspace_id == workspace_id)
+        .order_by(EvaluationReport.created_at.desc(), EvaluationReport.id.desc())
+        .limit(limit)
+    )).scalars().all()
+    return [
+        {
+            "id": report.id,
+            "created_at": report.created_at,
+            "model_version": report.model_version,
+            "rows": report.rows,
+            "labelled_rows": report.labelled_rows,
+            "accuracy": report.accuracy,
+            "classes": report.classes,
+            "confusion_matrix": report.confusion_matrix,
+            "per_class": report.per_class
+        }
+        for report in reports
+    ]
+
+async def top_talkers(db: AsyncSession, user, workspace_id, by, limit, since, until, label):
+    
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    workspace = (await db.execute(select(Workspace).where(
+        Workspace.id == workspace_id,
+        Workspace.user_id == user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
+    
+    # read from the per-hour counters kept up to date on insert, traffic_logs is never scanned
+    top = (await db.execute(top_talkers_query(workspace_id, by, limit, since, until, label))).all()
+    labels = {ip: {} for ip, _ in top}
+    if top:
+        for ip, status, count in (await db.execute(label_breakdown_query(workspace_id, list(labels), by, since, until))).all():
+            if count:
+                labels[ip][status] = int(count)
+    return [{"ip": ip, "count": int(count), "labels": labels[ip]} for ip, count in top]
+
+@router.get("/workspaces/{workspace_id}/top-attackers")
+async def get_top_attackers(
+    workspace_id: int,
+    limit: int = Query(10, ge=1, le=1000),
+    since: Optional[datetime] = Query(None, description="Only count traffic stored from this time (UTC)"),
+    until: Optional[datetime] = Query(None, description="Only count traffic stored up to this time (UTC)"),
+    label: Optional[str] = Query(None, description="Only count this label, 'all' includes BENIGN, default: every attack label"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> List[Dict[str, Any]]:
+    
+    return await top_talkers(db, current_user, workspace_id, "source", limit, since, until, label)
+
+@router.get("/workspaces/{workspace_id}/top-targets")
+async def get_top_targets(
+    workspace_id: int,
+    limit: int = Query(10, ge=1, le=1000),
+    since: Optional[datetime] = Query(None, description="Only count traffic stored from this time (UTC)"),
+    until: Optional[datetime] = Query(None, description="Only count traffic stored up to this time (UTC)"),
+    label: Optional[str] = Query(None, description="Only count this label, 'all' includes BENIGN, default: every attack label"),
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> List[Dict[str, Any]]:
+    
+    return await top_talkers(db, current_user, workspace_id, "destination", limit, since, until, label)
+
+@router.get("/workspaces/{workspace_id}/events")
+async def stream_workspace_events(
+    workspace_id: int,
+    request: Request,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> StreamingResponse:
+    
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    workspace = (await db.execute(select(Workspace).where(
+        Workspace.id == workspace_id,
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found or access denied")
+    
+    counts = dict((await db.execute(select(TrafficLog.status, func.count(TrafficLog.id)).where(
+        TrafficLog.workspace_id == workspace_id
+    ).group_by(TrafficLog.status))).all())
+    rollups = (await db.execute(select(TrafficLogRollup.status, func.sum(TrafficLogRollup.count)).where(
+        TrafficLogRollup.workspace_id == workspace_id
+    ).group_by(TrafficLogRollup.status))).all()
+    for status, count in rollups:
+        counts[status] = counts.get(status, 0) + int(count or 0)
+    snapshot = {"event": "snapshot", "data": json.dumps({"counts": counts})}
+    # release the connection, the stream can stay open for hours
+    await db.close()
+    
+    subscription = broker.subscribe(workspace_id)
+    
+    async def event_stream():
+        try:
+            yield format_sse(snapshot)
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=HEARTBEAT_INTERVAL)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/workspaces-for-monitor", response_model=List[WorkspaceResponse])
 async def get_workspaces_for_monitor(
     x_api_key: str = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> List[WorkspaceResponse]:
     
     if not x_api_key:
         raise HTTPException(status_code=401, detail="API key required")
     
     
-    user = db.query(User).filter(User.api_key == x_api_key).first()
+    user = (await db.execute(select(User).where(User.api_key == x_api_key))).scalars().first()
     if not user:
         raise HTTPException(status_code=401, detail="Invalid API key")
     
     
-    workspaces = db.query(Workspace).filter(Workspace.user_id == user.id).all()
+    workspaces = (await db.execute(select(Workspace).where(
+        Workspace.user_id == user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().all()
     return workspaces 
 
-@router.post("/direct-process")
-async def direct_process_csv(
-    request: Request,
-    x_api_key: str = Header(None)
-):
-    print(f"[INFO] Received request to /direct-process endpoint")
-    print(f"[INFO] API Key used: {x_api_key}")
+def render_json(data) -> JSONResponse:
     
-    try:
-        
-        body = await request.json()
+    return JSONResponse(jsonable_encoder(data))
+
+async def read_upload(request: Request):
+    
+    # CSV comes as JSON csv_text with its options, Parquet/Arrow as the raw body with options in the query
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    file_format = COLUMNAR_CONTENT_TYPES.get(content_type, "csv")
+    if file_format == "csv":
+        body = await run_in_threadpool(json.loads, await request.body())
         print(f"[INFO] Request body keys: {list(body.keys())}")
         
         
@@ -289,68 +543,118 @@ async def direct_process_csv(
                 status_code=400, 
                 detail="Missing required parameter: csv_text must be provided"
             )
+        return body.get('csv_text'), file_format, body
+    return await request.body(), file_format, dict(request.query_params)
+
+def option_number(options, name, cast, default=None):
+    
+    value = options.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {name}: {value!r}"
+        )
+
+def upload_options(options) -> Dict[str, Any]:
+    
+    top_k = option_number(options, 'top_k', int)
+    if top_k is not None and top_k < 0:
+        raise HTTPException(status_code=400, detail="top_k must not be negative")
+    min_attack_probability = option_number(options, 'min_attack_probability', float, MIN_ATTACK_PROBABILITY)
+    if not 0 <= min_attack_probability <= 1:
+        raise HTTPException(status_code=400, detail="min_attack_probability must be between 0 and 1")
+    return {
+        "workspace_id": option_number(options, 'workspace_id', int),
+        "top_k": top_k,
+        "return_proba": option_flag(options.get('return_proba', False)),
+        "evaluate": option_flag(options.get('evaluate', False)),
+        "return_original": option_flag(options.get('return_original', False)),
+        "min_attack_probability": min_attack_probability
+    }
+
+async def upload_owner(db: AsyncSession, x_api_key, workspace_id):
+    
+    if not workspace_id:
+        return None
+    if not x_api_key:
+        raise HTTPException(
+            status_code=400,
+            detail="API key required when workspace_id is specified"
+        )
+    
+    
+    user = (await db.execute(select(User).where(User.api_key == x_api_key))).scalars().first()
+    if not user:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid API key"
+        )
+    
+    
+    workspace = (await db.execute(select(Workspace).where(
+        Workspace.id == workspace_id,
+        Workspace.user_id == user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
+    if not workspace:
+        raise HTTPException(
+            status_code=404,
+            detail="Workspace not found or access denied"
+        )
+    return user
+
+async def checked_plan(payload, file_format, evaluate):
+    
+    # reject files without the model's features before parsing them
+    try:
+        plan = await run_in_threadpool(upload_plan, payload, file_format, evaluate)
+    except pa.ArrowInvalid as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {file_format} payload: {str(e)}")
+    if plan.missing:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Upload is missing required feature columns: {', '.join(plan.missing)}"
+        )
+    return plan
+
+@router.post("/direct-process")
+async def direct_process_csv(
+    request: Request,
+    x_api_key: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    print(f"[INFO] Received request to /direct-process endpoint")
+    print(f"[INFO] API Key used: {x_api_key}")
+    
+    try:
         
-        csv_text = body.get('csv_text')
-        workspace_id = body.get('workspace_id')
-        
-        
-        if workspace_id:
-            if not x_api_key:
-                raise HTTPException(
-                    status_code=400,
-                    detail="API key required when workspace_id is specified"
-                )
-            
-            
-            db = next(get_db())
-            user = db.query(User).filter(User.api_key == x_api_key).first()
-            if not user:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid API key"
-                )
-            
-            
-            workspace = db.query(Workspace).filter(
-                Workspace.id == workspace_id,
-                Workspace.user_id == user.id
-            ).first()
-            if not workspace:
-                raise HTTPException(
-                    status_code=404,
-                    detail="Workspace not found or access denied"
-                )
-        print(f"[INFO] Received CSV text data, length: {len(csv_text)}")
-        
+        payload, file_format, options = await read_upload(request)
+        options = upload_options(options)
+        workspace_id = options["workspace_id"]
+        top_k = options["top_k"]
+        return_proba = options["return_proba"]
+        evaluate = options["evaluate"]
+        min_attack_probability = options["min_attack_probability"]
         
-        import tempfile
-        import os
+        await upload_owner(db, x_api_key, workspace_id)
+        print(f"[INFO] Received {file_format} data, length: {len(payload)}")
+        plan = await checked_plan(payload, file_format, evaluate)
         
-        with tempfile.NamedTemporaryFile(suffix='.csv', mode='w', delete=False) as temp_file:
-            temp_file_path = temp_file.name
-            temp_file.write(csv_text)
-            print(f"[INFO] Saved CSV data to temporary file: {temp_file_path}")
         
         try:
             
-            import importlib.util
-            
-            app_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "app")
-            spec = importlib.util.spec_from_file_location("pipeline_manager", os.path.join(app_dir, "pipeline_manager.py"))
-            pipeline_manager_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(pipeline_manager_module)
+            # end the read transaction so no connection is held while scoring
+            await db.commit()
             
             
-            import pandas as pd
-            import io
-            
-            
-            df = pd.read_csv(io.StringIO(csv_text))
-            original_data = df.to_dict(orient='records')
-            
-            
-            print(f"[INFO] Calling pipeline_manager.process_file with {temp_file_path}")
-            predictions = pipeline_manager_module.process_file(temp_file_path)
+            print(f"[INFO] Calling inference.process_frame")
+            predictions, scores, kept_rows, original_data = await run_in_threadpool(
+                score_upload, payload, file_format, plan, top_k, return_proba, evaluate
+            )
             print(f"[INFO] Predictions generated: {predictions[:5] if hasattr(predictions, '__iter__') else predictions}")
             
             
@@ -375,77 +679,58 @@ async def direct_process_csv(
                     predictions_list = predictions
             
             
-            from datetime import datetime, timezone
             current_time = datetime.now(timezone.utc).isoformat()
-            response_data = {
-                "status": "success",
-                "predictions": predictions_list,
-                "original_data": original_data,
-                "timestamp": current_time
-            }
+            response_data = upload_response(predictions_list, original_data, scores, evaluate, current_time)
             
             
             try:
                 
                 user_id = None
                 if x_api_key:
-                    db = next(get_db())
-                    user = db.query(User).filter(User.api_key == x_api_key).first()
+                    user = (await db.execute(select(User).where(User.api_key == x_api_key))).scalars().first()
                     if user:
                         user_id = user.id
                 
                 
-                if user_id and len(predictions_list) > 0 and len(original_data) > 0:
-                    for i, (pred, data_row) in enumerate(zip(predictions_list, original_data)):
-                        
-                        
-                        
-                        source_ip = (data_row.get('Source IP') or 
-                                   data_row.get(' Source IP') or 
-                                   data_row.get('Src IP') or 
-                                   data_row.get(' Src IP') or
-                                   data_row.get('src_ip') or
-                                   data_row.get('source_ip') or 'N/A')
-                        
-                        
-                        destination_ip = (data_row.get('Destination IP') or 
-                                        data_row.get(' Destination IP') or 
-                                        data_row.get('Dst IP') or 
-                                        data_row.get(' Dst IP') or
-                                        data_row.get('dst_ip') or
-                                        data_row.get('destination_ip') or 
-                                        f"Port: {data_row.get(' Destination Port', data_row.get('Destination Port', 'unknown'))}")
-                        
-                        
-                        protocol = (data_row.get('Protocol') or 
-                                  data_row.get(' Protocol') or 
-                                  data_row.get('protocol') or 'TCP/IP')
-                        
-                        
-                        traffic_log = TrafficLog(
-                            user_id=user_id,
-                            workspace_id=workspace_id,  
-                            source_ip=source_ip,
-                            destination_ip=destination_ip,
-                            protocol=protocol,
-                            status=str(pred),  
-                            headers=data_row
-                        )
-                        db.add(traffic_log)
-                        
-                        
-                        if i % 100 == 0:
-                            db.commit()
+                log_predictions, log_kept_rows = rows_to_log(predictions_list, kept_rows, scores, min_attack_probability)
+                
+                if user_id and len(log_predictions) > 0:
+                    stored_rows, log_rows = await run_in_threadpool(
+                        build_log_rows, user_id, workspace_id, log_predictions, log_kept_rows, plan
+                    )
                     
                     
-                    db.commit()
+                    try:
+                        log_ids = (await db.execute(
+                            insert(TrafficLog).returning(TrafficLog.id, sort_by_parameter_order=True), log_rows
+                        )).scalars().all()
+                        stored_rows = with_log_ids(stored_rows, log_ids)
+                        if workspace_id:
+                            await db.execute(talker_upsert(), talker_counts(workspace_id, stored_rows))
+                        await db.commit()
+                    except Exception:
+                        await db.rollback()
+                        await run_in_threadpool(discard_batch, workspace_id, log_rows)
+                        raise
+                    
+                    if workspace_id:
+                        publish_detections(workspace_id, stored_rows, current_time)
+                
+                # every scored row feeds the drift sketch, including the ones not persisted
+                if user_id and workspace_id and scores["drift_sketch"] is not None:
+                    await db.execute(insert(DriftSketch).values(**drift_sketch_values(workspace_id, scores)))
+                    await db.commit()
+                
+                if user_id and workspace_id and scores.get("evaluation"):
+                    await db.execute(insert(EvaluationReport).values(**evaluation_values(workspace_id, user_id, scores["evaluation"])))
+                    await db.commit()
             except Exception as e:
                 print(f"[WARNING] Failed to store logs in database: {str(e)}")
                 
                 pass
             
             print(f"[INFO] Returning response with predictions and original data")
-            return response_data
+            return await run_in_threadpool(render_json, response_data)
             
         except Exception as e:
             print(f"[ERROR] Error processing CSV: {str(e)}")
@@ -455,17 +740,14 @@ async def direct_process_csv(
                 status_code=500,
                 detail=f"Error processing CSV data: {str(e)}"
             )
-        finally:
-            
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-                print(f"[INFO] Removed temporary file: {temp_file_path}")
                 
     except json.JSONDecodeError:
         raise HTTPException(
             status_code=400,
             detail="Invalid JSON in request body"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[ERROR] Unexpected error: {str(e)}")
         import traceback
@@ -473,4 +755,81 @@ async def direct_process_csv(
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    x_api_key: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> Dict[str, Any]:
+    
+    # same body and options as /direct-process, but only validated and queued here, a scoring worker does the rest
+    try:
+        payload, file_format, options = await read_upload(request)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON in request body")
+    options = upload_options(options)
+    user = await upload_owner(db, x_api_key, options["workspace_id"])
+    if user is None and x_api_key:
+        user = (await db.execute(select(User).where(User.api_key == x_api_key))).scalars().first()
+    await checked_plan(payload, file_format, options["evaluate"])
+    
+    values = await run_in_threadpool(
+        new_job_values, payload, file_format, options, user.id if user else None, options["workspace_id"]
+    )
+    await db.execute(insert(ScoringJob).values(**values))
+    await db.commit()
+    notify_workers()
+    print(f"[INFO] Queued {file_format} upload of {len(payload)} bytes as job {values['id']}")
+    return {"job_id": values["id"], "status": values["status"]}
+
+async def job_for_caller(db: AsyncSession, job_id: str, request: Request, x_api_key) -> ScoringJob:
+    
+    job = (await db.execute(
+        select(ScoringJob).options(defer(ScoringJob.payload)).where(ScoringJob.id == job_id)
+    )).scalars().first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # jobs submitted with an API key are only visible to that user, anonymous ones to whoever holds the id
+    if job.user_id is not None:
+        api_key = x_api_key or request.cookies.get("api_key")
+        user = (await db.execute(select(User).where(User.api_key == api_key))).scalars().first() if api_key else None
+        if not user or user.id != job.user_id:
+            raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    request: Request,
+    x_api_key: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+) -> Dict[str, Any]:
+    
+    return job_status(await job_for_caller(db, job_id, request, x_api_key))
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    request: Request,
+    page: Optional[int] = Query(None, ge=0, description="Page of JOB_PAGE_ROWS predictions, default: all of them"),
+    x_api_key: str = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    
+    job = await job_for_caller(db, job_id, request, x_api_key)
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""))
+    query = select(ScoringJobResult.data).where(ScoringJobResult.job_id == job_id)
+    if page is not None:
+        if page >= (job.pages or 1):
+            raise HTTPException(status_code=404, detail=f"Job has {job.pages} pages")
+        query = query.where(ScoringJobResult.part == page)
+    parts = (await db.execute(query.order_by(ScoringJobResult.part))).scalars().all()
+    await db.close()
+    
+    result = merge_result(job.summary, parts)
+    if page is not None:
+        result.update(page=page, pages=job.pages)
+    return await run_in_threadpool(render_json, result)
@@ -0,0 +1,49 @@
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+from labels import BENIGN_LABEL
+
+
+CASCADE_MAX_DEPTH = 8
+CASCADE_TARGET_RECALL = 0.999
+# the recall quantile is only trusted with at least this many attacks in the validation split
+CASCADE_MIN_ATTACK_SAMPLES = 200
+# a threshold that forwards more of the validation rows than this would only add the screening cost
+CASCADE_MAX_FORWARD_FRACTION = 0.9
+
+
+def is_attack(labels) -> np.ndarray:
+    return (np.asarray(labels) != BENIGN_LABEL).astype(np.int8)
+
+def fit_cascade(X, y, max_depth: int = CASCADE_MAX_DEPTH, random_state: int = 42) -> DecisionTreeClassifier:
+
+    model = DecisionTreeClassifier(
+        max_depth=max_depth,
+        min_samples_leaf=20,
+        class_weight="balanced",
+        random_state=random_state
+    )
+    model.fit(X, is_attack(y))
+    return model
+
+def choose_threshold(model, X, y, target_recall: float = CASCADE_TARGET_RECALL):
+
+    # highest threshold that still forwards target_recall of the attacks to the full model,
+    # None when the validation data can not support a cascade that saves any work
+    classes = list(model.classes_)
+    if 1 not in classes:
+        print("[WARNING] The cascade model never saw an attack, cascade not enabled")
+        return None
+    scores = model.predict_proba(X)[:, classes.index(1)]
+    attack_scores = scores[is_attack(y) == 1]
+    if len(attack_scores) < CASCADE_MIN_ATTACK_SAMPLES:
+        print(f"[WARNING] Only {len(attack_scores)} attacks to pick the cascade threshold from, "
+              f"at least {CASCADE_MIN_ATTACK_SAMPLES} are needed, cascade not enabled")
+        return None
+    threshold = min(float(np.quantile(attack_scores, 1 - target_recall, method="lower")), 0.5)
+    forwarded = float((scores >= threshold).mean())
+    if threshold <= 0 or forwarded > CASCADE_MAX_FORWARD_FRACTION:
+        print(f"[WARNING] Threshold {threshold:.4f} forwards {forwarded:.2%} of the validation rows "
+              f"to the full model, cascade not enabled")
+        return None
+    return threshold
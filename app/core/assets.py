@@ -0,0 +1,76 @@
+import hashlib
+import os
+from functools import lru_cache
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.staticfiles import StaticFiles
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+STATIC_PREFIX = "/static"
+# responses smaller than this are sent as they are, compressing them costs more than it saves
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+# hashed asset urls never change content, so browsers may keep them for a year
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+# on for development, templates and static hashes are then re-read when their files change
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "0").lower() in ("1", "true", "yes", "on")
+
+
+@lru_cache(maxsize=None)
+def _static_hash(path: str, mtime_ns: int) -> str:
+
+    with open(os.path.join(STATIC_DIR, path), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def static_url(path: str) -> str:
+
+    full_path = os.path.join(STATIC_DIR, path)
+    if not os.path.isfile(full_path):
+        return f"{STATIC_PREFIX}/{path}"
+    mtime_ns = os.stat(full_path).st_mtime_ns if TEMPLATE_AUTO_RELOAD else 0
+    return f"{STATIC_PREFIX}/{path}?v={_static_hash(path, mtime_ns)}"
+
+
+class CachedStaticFiles(StaticFiles):
+
+    # urls from static_url carry the content hash and are cached for good,
+    # anything else is revalidated against its ETag on every use
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        versioned = b"v=" in scope.get("query_string", b"")
+        response.headers["Cache-Control"] = (
+            f"public, max-age={STATIC_MAX_AGE}, immutable" if versioned else "no-cache"
+        )
+        return response
+
+
+class CompressionMiddleware:
+
+    # Brotli when brotli-asgi is installed and the client accepts it, gzip otherwise.
+    # Live event streams are passed through untouched, a compressor would hold events back
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] != "http" or self.is_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        await self.compressed(scope, receive, send)
+
+    @staticmethod
+    def is_stream(scope) -> bool:
+
+        return scope["path"].endswith("/events") or "text/event-stream" in Headers(scope=scope).get("accept", "")
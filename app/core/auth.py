@@ -1,16 +1,34 @@
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel, EmailStr
+import asyncio
+import os
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from passlib.context import CryptContext
 
 from .database import get_db, User
 
 
-pwd_context = CryptContext(schemes=["bcrypt", "pbkdf2_sha256", "sha256_crypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+# hashes with another cost, or from the deprecated schemes, are replaced on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt", "pbkdf2_sha256", "sha256_crypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt is deliberately slow, a few dedicated threads keep it off the event loop
+# and out of the threadpool the scoring requests run in
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 
 users: Dict[str, dict] = {}
@@ -44,30 +62,35 @@ def get_password_hash(password: str) -> str:
     
     return pwd_context.hash(password)
 
+async def run_password_work(func, *args):
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, func, *args)
+
 def generate_api_key() -> str:
     
     return secrets.token_urlsafe(32)
 
-async def get_user_by_api_key(db: Session, api_key: str) -> UserInDB:
+async def get_user_by_api_key(db: AsyncSession, api_key: str) -> UserInDB:
     
-    user = db.query(User).filter(User.api_key == api_key).first()
+    user = (await db.execute(select(User).where(User.api_key == api_key))).scalars().first()
     if not user:
         raise HTTPException(status_code=401, detail="Invalid API key")
     return UserInDB.model_validate(user)
 
-def create_user(db: Session, username: str, email: str, password: str) -> UserInDB:
+async def create_user(db: AsyncSession, username: str, email: str, password: str) -> UserInDB:
     
     try:
         
-        if db.query(User).filter(User.username == username).first():
+        if (await db.execute(select(User.id).where(User.username == username))).first():
             raise HTTPException(status_code=400, detail="Username already registered")
         
         
-        if db.query(User).filter(User.email == email).first():
+        if (await db.execute(select(User.id).where(User.email == email))).first():
             raise HTTPException(status_code=400, detail="Email already registered")
         
         api_key = generate_api_key()
-        hashed_password = get_password_hash(password)
+        hashed_password = await run_password_work(get_password_hash, password)
         
         db_user = User(
             username=username,
@@ -77,20 +100,31 @@ def create_user(db: Session, username: str, email: str, password: str) -> UserIn
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
         return UserInDB.model_validate(db_user)
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Username or email already registered")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
 
-def authenticate_user(db: Session, username: str, password: str) -> UserInDB:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> UserInDB:
+    
+    user = (await db.execute(select(User).where(User.username == username))).scalars().first()
+    if not user:
+        # unknown usernames cost as much as wrong passwords, so they can't be told apart by timing
+        await run_password_work(pwd_context.dummy_verify)
+        raise HTTPException(status_code=401, detail="Invalid username or password")
     
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password):
+    valid, new_hash = await run_password_work(pwd_context.verify_and_update, password, user.password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+        await db.refresh(user)
+        print(f"[INFO] Rehashed password for user {user.id}")
     return UserInDB.model_validate(user) 
\ No newline at end of file
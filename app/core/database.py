@@ -1,14 +1,21 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import func, inspect, insert, select, text, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timezone
 
-# Create SQLite database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./anomaly_detection.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from .db_config import create_configured_engine, create_configured_async_engine, database_url
+
+# SQLite by default, set SQLALCHEMY_DATABASE_URL to use PostgreSQL
+SQLALCHEMY_DATABASE_URL = database_url()
+engine = create_configured_engine(SQLALCHEMY_DATABASE_URL)
+
+# aiosqlite / asyncpg engine used by the API endpoints
+async_engine = create_configured_async_engine(SQLALCHEMY_DATABASE_URL)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Create Base class
 Base = declarative_base()
@@ -20,11 +27,12 @@ class Workspace(Base):
     name = Column(String, index=True)
     description = Column(String, nullable=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    deleted_at = Column(DateTime, nullable=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     
     # Relationships
     user = relationship("User", back_populates="workspaces")
-    traffic_logs = relationship("TrafficLog", back_populates="workspace", cascade="all, delete-orphan")
+    traffic_logs = relationship("TrafficLog", back_populates="workspace", cascade="all, delete-orphan", passive_deletes=True)
 
 class User(Base):
     __tablename__ = "users"
@@ -38,28 +46,171 @@ class User(Base):
     
     # Relationships
     workspaces = relationship("Workspace", back_populates="user", cascade="all, delete-orphan")
-    traffic_logs = relationship("TrafficLog", back_populates="user", cascade="all, delete-orphan")
+    traffic_logs = relationship("TrafficLog", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 class TrafficLog(Base):
     __tablename__ = "traffic_logs"
+    __table_args__ = (
+        Index("ix_traffic_logs_workspace_period", "workspace_id", "period"),
+        # retention drops by period, compaction scans BENIGN rows by age
+        Index("ix_traffic_logs_period", "period"),
+        Index("ix_traffic_logs_status_timestamp", "status", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    workspace_id = Column(Integer, ForeignKey("workspaces.id"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"))
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    period = Column(String, nullable=True)
     source_ip = Column(String)
     destination_ip = Column(String)
     protocol = Column(String)
     status = Column(String)
-    headers = Column(JSON)
+    headers = Column(JSON, nullable=True)
+    batch_id = Column(String, index=True, nullable=True)
+    batch_row = Column(Integer, nullable=True)
     payload_size = Column(Integer, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="traffic_logs")
     workspace = relationship("Workspace", back_populates="traffic_logs")
 
+class TrafficLogRollup(Base):
+    __tablename__ = "traffic_log_rollups"
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "day", "status", name="uq_traffic_log_rollups_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"), index=True)
+    day = Column(String)
+    status = Column(String)
+    count = Column(Integer, default=0)
+
+class TrafficTalker(Base):
+    __tablename__ = "traffic_talkers"
+    __table_args__ = (
+        UniqueConstraint("workspace_id", "bucket", "source_ip", "destination_ip", "status", name="uq_traffic_talkers_key"),
+        Index("ix_traffic_talkers_workspace_destination", "workspace_id", "destination_ip"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"))
+    bucket = Column(String)  # hour the rows were stored in, "YYYY-MM-DD HH"
+    source_ip = Column(String)
+    destination_ip = Column(String)
+    status = Column(String)
+    count = Column(Integer, default=0)
+
+class DriftSketch(Base):
+    __tablename__ = "drift_sketches"
+    __table_args__ = (
+        Index("ix_drift_sketches_workspace_period", "workspace_id", "period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"))
+    period = Column(String)
+    baseline = Column(String)
+    rows = Column(Integer, default=0)
+    sketch = Column(LargeBinary)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class EvaluationReport(Base):
+    __tablename__ = "evaluation_reports"
+    __table_args__ = (
+        Index("ix_evaluation_reports_workspace_created", "workspace_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    model_version = Column(String)
+    rows = Column(Integer, default=0)
+    labelled_rows = Column(Integer, default=0)
+    accuracy = Column(Float, nullable=True)
+    classes = Column(JSON)
+    confusion_matrix = Column(JSON)
+    per_class = Column(JSON)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class ScoringJob(Base):
+    __tablename__ = "scoring_jobs"
+    __table_args__ = (
+        Index("ix_scoring_jobs_status_created", "status", "created_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
+    workspace_id = Column(Integer, ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=True, index=True)
+    status = Column(String, default="queued")
+    file_format = Column(String, default="csv")
+    options = Column(JSON, nullable=True)
+    payload = Column(LargeBinary, nullable=True)  # dropped once the job has finished
+    worker = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    rows = Column(Integer, nullable=True)
+    rows_parsed = Column(Integer, nullable=True)
+    rows_cleaned = Column(Integer, nullable=True)
+    rows_scored = Column(Integer, nullable=True)
+    pages = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    summary = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class ScoringJobResult(Base):
+    __tablename__ = "scoring_job_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, ForeignKey("scoring_jobs.id", ondelete="CASCADE"), index=True)
+    part = Column(Integer, default=0)
+    rows = Column(Integer, default=0)
+    data = Column(JSON)
+
+def add_missing_columns(bind=engine):
+    
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"[INFO] Added column {table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+def backfill_traffic_talkers(bind=engine):
+
+    # counts the logs stored before traffic_talkers existed, hourly like the live counters
+    if bind.dialect.name == "sqlite":
+        bucket = func.strftime("%Y-%m-%d %H", TrafficLog.timestamp)
+    else:
+        bucket = func.to_char(TrafficLog.timestamp, "YYYY-MM-DD HH24")
+    columns = ("workspace_id", "bucket", "source_ip", "destination_ip", "status", "count")
+    grouped = select(
+        TrafficLog.workspace_id, bucket, TrafficLog.source_ip, TrafficLog.destination_ip, TrafficLog.status,
+        func.count(TrafficLog.id)
+    ).where(
+        TrafficLog.workspace_id.is_not(None), TrafficLog.timestamp.is_not(None)
+    ).group_by(TrafficLog.workspace_id, bucket, TrafficLog.source_ip, TrafficLog.destination_ip, TrafficLog.status)
+    with bind.begin() as connection:
+        result = connection.execute(insert(TrafficTalker).from_select(columns, grouped))
+    print(f"[INFO] Backfilled {result.rowcount} top talker counters from traffic_logs")
+
 # Create all tables
+new_talkers_table = not inspect(engine).has_table(TrafficTalker.__tablename__)
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
+if new_talkers_table:
+    backfill_traffic_talkers()
 
 # Dependency to get DB session
 def get_db():
@@ -67,4 +218,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db 
\ No newline at end of file
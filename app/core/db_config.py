@@ -0,0 +1,113 @@
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+DEFAULT_DATABASE_URL = "sqlite:///./anomaly_detection.db"
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# ON makes SQLite enforce the ondelete cascades the models declare, as PostgreSQL always does
+SQLITE_FOREIGN_KEYS = os.getenv("SQLITE_FOREIGN_KEYS", "ON")
+
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+}
+
+
+def database_url() -> str:
+    return os.getenv("SQLALCHEMY_DATABASE_URL", DEFAULT_DATABASE_URL)
+
+def is_sqlite(url) -> bool:
+    return make_url(str(url)).get_backend_name() == "sqlite"
+
+def is_memory_sqlite(url) -> bool:
+
+    url = make_url(str(url))
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+def sqlite_pragmas():
+
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA foreign_keys={SQLITE_FOREIGN_KEYS}",
+    ]
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+def engine_options(url) -> dict:
+
+    if is_sqlite(url):
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
+        # in-memory databases live in a single connection, SQLAlchemy picks a pool without these settings
+        if not is_memory_sqlite(url):
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def configure_engine(engine: Engine) -> Engine:
+
+    if is_sqlite(engine.url):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+def create_configured_engine(url=None, **overrides) -> Engine:
+
+    url = url or database_url()
+    options = engine_options(url)
+    options.update(overrides)
+    return configure_engine(create_engine(url, **options))
+
+def async_database_url(url=None) -> str:
+
+    url = make_url(str(url or database_url()))
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def create_configured_async_engine(url=None, **overrides) -> AsyncEngine:
+
+    url = async_database_url(url)
+    options = engine_options(url)
+    if is_sqlite(url) and not is_memory_sqlite(url):
+        options["poolclass"] = AsyncAdaptedQueuePool
+    options.update(overrides)
+    engine = create_async_engine(url, **options)
+    configure_engine(engine.sync_engine)
+    return engine
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+
+SUBSCRIBER_BUFFER_SIZE = 256
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscription:
+    def __init__(self, broker, topic, maxsize: int = SUBSCRIBER_BUFFER_SIZE):
+        self.broker = broker
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _push(self, event: Dict[str, Any]):
+
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, topic, maxsize: int = SUBSCRIBER_BUFFER_SIZE) -> Subscription:
+        subscription = Subscription(self, topic, maxsize)
+        with self._lock:
+            self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.topic)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.topic]
+
+    def subscriber_count(self, topic) -> int:
+        with self._lock:
+            return len(self._subscribers.get(topic, ()))
+
+    def publish(self, topic, event_type: str, data: Any) -> int:
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        if not subscribers:
+            return 0
+
+        event = {"event": event_type, "data": json.dumps(data, default=str)}
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {event['data']}\n\n"
+
+
+broker = EventBroker()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+FEATURE_STORE_DIR = Path(os.getenv("FEATURE_STORE_DIR", "./feature_store"))
+FEATURE_STORE_COMPRESSION = os.getenv("FEATURE_STORE_COMPRESSION", "zstd")
+
+
+def new_batch_id(created_at: Optional[datetime] = None) -> str:
+
+    created_at = created_at or datetime.now(timezone.utc)
+    return f"{created_at:%Y%m}_{uuid.uuid4().hex}"
+
+def workspace_dir(workspace_id) -> Path:
+    return FEATURE_STORE_DIR / f"workspace_{workspace_id}"
+
+def batch_period(batch_id: str) -> str:
+    return batch_id.split("_", 1)[0]
+
+def batch_path(workspace_id, batch_id: str) -> Path:
+    return workspace_dir(workspace_id) / batch_period(batch_id) / f"{batch_id}.parquet"
+
+def _compact_frame(frame: pd.DataFrame) -> pd.DataFrame:
+
+    frame = frame.rename(columns=lambda col: str(col).strip())
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+
+    columns = {}
+    for col in frame.columns:
+        values = frame[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            columns[col] = values.to_numpy(dtype=np.float32)
+        else:
+            # nullable strings, a missing IP stays null instead of becoming the text 'nan'
+            columns[col] = values.astype("string").reset_index(drop=True)
+    return pd.DataFrame(columns)
+
+def write_batch(workspace_id, frame: pd.DataFrame, batch_id: Optional[str] = None) -> str:
+
+    batch_id = batch_id or new_batch_id()
+    path = batch_path(workspace_id, batch_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_suffix(".parquet.tmp")
+    _compact_frame(frame).to_parquet(tmp_path, index=False, compression=FEATURE_STORE_COMPRESSION)
+    os.replace(tmp_path, path)
+    return batch_id
+
+def delete_batch(workspace_id, batch_id: str):
+
+    batch_path(workspace_id, batch_id).unlink(missing_ok=True)
+
+def read_batch(workspace_id, batch_id: str, rows: Optional[Sequence[int]] = None,
+               columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+
+    frame = pd.read_parquet(batch_path(workspace_id, batch_id), columns=columns)
+    if rows is not None:
+        frame = frame.iloc[list(rows)]
+    return frame
+
+def read_row(workspace_id, batch_id: str, row: int) -> dict:
+
+    record = read_batch(workspace_id, batch_id, rows=[row]).to_dict(orient="records")[0]
+    return {key: (None if pd.isna(value) else value) for key, value in record.items()}
+
+def delete_workspace(workspace_id):
+    shutil.rmtree(workspace_dir(workspace_id), ignore_errors=True)
+
+def drop_periods_before(period: str) -> int:
+
+    dropped = 0
+    if not FEATURE_STORE_DIR.exists():
+        return dropped
+    for period_dir in FEATURE_STORE_DIR.glob("workspace_*/*"):
+        if period_dir.is_dir() and period_dir.name < period:
+            shutil.rmtree(period_dir, ignore_errors=True)
+            dropped += 1
+    return dropped
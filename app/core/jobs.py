@@ -0,0 +1,321 @@
+import argparse
+import math
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import traceback
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, ScoringJob, ScoringJobResult
+from .uploads import score_upload, store_upload, upload_plan, upload_response
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from schema import SchemaError
+
+
+# scoring threads started inside the API process, 0 leaves every job to `python -m app.core.jobs` workers
+EMBEDDED_SCORING_WORKERS = int(os.getenv("EMBEDDED_SCORING_WORKERS", "1"))
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", str(os.cpu_count() or 1)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# a running job whose worker stopped reporting for this long is handed to another worker
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# the model runs this many rows at a time, each chunk updates the job's progress
+JOB_CHUNK_ROWS = int(os.getenv("JOB_CHUNK_ROWS", "50000"))
+JOB_PAGE_ROWS = int(os.getenv("JOB_PAGE_ROWS", "10000"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+PROGRESS_COLUMNS = {"parsed": "rows_parsed", "cleaned": "rows_cleaned", "scored": "rows_scored"}
+# per-row fields, kept in scoring_job_results rather than in the job's summary
+ROW_FIELDS = ("predictions", "original_data", "top_k", "probabilities", "attack_probability")
+
+_wakeup = threading.Event()
+
+
+class JobLostError(Exception):
+    pass
+
+
+def new_job_values(payload, file_format, options, user_id=None, workspace_id=None) -> dict:
+
+    return dict(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        workspace_id=workspace_id,
+        status=QUEUED,
+        file_format=file_format,
+        options=options,
+        payload=payload.encode("utf-8") if isinstance(payload, str) else bytes(payload),
+        attempts=0,
+        created_at=datetime.now(timezone.utc)
+    )
+
+def notify_workers():
+
+    # embedded workers pick the job up at once instead of at their next poll
+    _wakeup.set()
+
+def job_status(job: ScoringJob) -> dict:
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "workspace_id": job.workspace_id,
+        "file_format": job.file_format,
+        "attempts": job.attempts,
+        "worker": job.worker,
+        "rows": job.rows,
+        "progress": {stage: getattr(job, column) for stage, column in PROGRESS_COLUMNS.items()},
+        "pages": job.pages,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "summary": job.summary
+    }
+
+def requeue_stale_jobs(db: Session, lease_seconds: int = JOB_LEASE_SECONDS) -> int:
+
+    stale = datetime.now(timezone.utc) - timedelta(seconds=lease_seconds)
+    lost = (ScoringJob.status == RUNNING) & (ScoringJob.heartbeat_at < stale)
+    failed = db.execute(update(ScoringJob).where(lost, ScoringJob.attempts >= JOB_MAX_ATTEMPTS).values(
+        status=FAILED, error="Worker stopped responding", payload=None, finished_at=datetime.now(timezone.utc)
+    ))
+    requeued = db.execute(update(ScoringJob).where(lost).values(status=QUEUED, worker=None))
+    db.commit()
+    if failed.rowcount or requeued.rowcount:
+        print(f"[WARNING] {requeued.rowcount} stalled scoring jobs requeued, {failed.rowcount} given up")
+    return requeued.rowcount
+
+def claim_job(db: Session, worker_id: str):
+
+    requeue_stale_jobs(db)
+    while True:
+        job_id = db.execute(
+            select(ScoringJob.id).where(ScoringJob.status == QUEUED).order_by(ScoringJob.created_at).limit(1)
+        ).scalar()
+        if job_id is None:
+            return None
+        # the conditional update is the claim, when another worker got there first the next job is tried
+        now = datetime.now(timezone.utc)
+        claimed = db.execute(update(ScoringJob).where(ScoringJob.id == job_id, ScoringJob.status == QUEUED).values(
+            status=RUNNING, worker=worker_id, attempts=ScoringJob.attempts + 1, started_at=now, heartbeat_at=now
+        ))
+        db.commit()
+        if claimed.rowcount == 1:
+            return db.get(ScoringJob, job_id)
+
+def owned_by(job_id: str, worker_id: str, attempt: int):
+
+    # a requeued job is claimed again with a new attempt, so a late first run matches nothing
+    return (ScoringJob.id == job_id) & (ScoringJob.status == RUNNING) & \
+        (ScoringJob.worker == worker_id) & (ScoringJob.attempts == attempt)
+
+def heartbeat(db: Session, job_id: str, worker_id: str, attempt: int, **values):
+
+    # called inside the transaction it fences, the row stays locked until that commits
+    claimed = db.execute(update(ScoringJob).where(owned_by(job_id, worker_id, attempt)).values(
+        **values, heartbeat_at=datetime.now(timezone.utc)
+    ))
+    if claimed.rowcount != 1:
+        db.rollback()
+        raise JobLostError(f"Job {job_id} was handed to another worker")
+
+def finish_job(db: Session, job_id: str, status: str, rows=None, summary=None, error=None, pages=None, owner=None) -> bool:
+
+    query = update(ScoringJob).where(ScoringJob.id == job_id if owner is None else owned_by(job_id, *owner))
+    finished = db.execute(query.values(
+        status=status, rows=rows, summary=summary, error=error, pages=pages, payload=None,
+        finished_at=datetime.now(timezone.utc)
+    ))
+    if owner is not None and finished.rowcount != 1:
+        # another worker owns the job now, its run decides the outcome
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+def progress_recorder(db: Session, job_id: str, worker_id: str, attempt: int):
+
+    # every stage doubles as the worker's heartbeat
+    def record(stage, rows):
+        heartbeat(db, job_id, worker_id, attempt, **{PROGRESS_COLUMNS[stage]: rows})
+        db.commit()
+    return record
+
+def page_rows(data, start, stop) -> dict:
+
+    page = {}
+    for key, value in data.items():
+        if key == "top_k":
+            page[key] = {"labels": value["labels"][start:stop], "scores": value["scores"][start:stop]}
+        elif key == "probabilities":
+            page[key] = {"classes": value["classes"], "values": value["values"][start:stop]}
+        else:
+            page[key] = value[start:stop]
+    return page
+
+def merge_pages(pages) -> dict:
+
+    merged = {}
+    for page in pages:
+        for key, value in page.items():
+            if key == "top_k":
+                target = merged.setdefault(key, {"labels": [], "scores": []})
+                target["labels"] += value["labels"]
+                target["scores"] += value["scores"]
+            elif key == "probabilities":
+                merged.setdefault(key, {"classes": value["classes"], "values": []})["values"] += value["values"]
+            else:
+                merged.setdefault(key, []).extend(value)
+    return merged
+
+def run_job(db: Session, job: ScoringJob, on_stored=None, page_rows_per_part: int = JOB_PAGE_ROWS):
+
+    # read once: every progress commit would otherwise reload the row, payload included
+    job_id, user_id, workspace_id, file_format = job.id, job.user_id, job.workspace_id, job.file_format
+    owner = (job.worker, job.attempts)
+    options = job.options or {}
+    payload = job.payload.decode("utf-8") if file_format == "csv" else job.payload
+    evaluate = options.get("evaluate", False)
+    plan = upload_plan(payload, file_format, evaluate).validate()
+    predictions, scores, kept_rows, original_data = score_upload(
+        payload, file_format, plan, options.get("top_k"), options.get("return_proba", False), evaluate,
+        chunk_rows=JOB_CHUNK_ROWS, on_progress=progress_recorder(db, job_id, *owner),
+        return_original=options.get("return_original", False)
+    )
+    del payload
+
+    timestamp = datetime.now(timezone.utc).isoformat()
+    if len(predictions) == 0:
+        response_data = {
+            "status": "warning",
+            "message": "No predictions were generated. The file may be empty or contain invalid data.",
+            "predictions": [],
+            "original_data": [],
+            "timestamp": timestamp
+        }
+    else:
+        predictions_list = predictions.tolist()
+        response_data = upload_response(predictions_list, original_data, scores, evaluate, timestamp)
+        response_data["counts"] = dict(Counter(predictions_list))
+        # the feature store write and the inserts can be slow, they start with a fresh lease
+        heartbeat(db, job_id, *owner)
+        db.commit()
+        try:
+            stored_rows = store_upload(
+                db, user_id, workspace_id, plan, predictions_list, kept_rows, scores,
+                options.get("min_attack_probability", 0), guard=lambda: heartbeat(db, job_id, *owner)
+            )
+            if on_stored is not None and workspace_id and stored_rows:
+                on_stored(workspace_id, stored_rows, timestamp)
+        except JobLostError:
+            raise
+        except Exception as e:
+            db.rollback()
+            print(f"[WARNING] Failed to store logs of job {job_id} in database: {str(e)}")
+
+    summary = {key: value for key, value in response_data.items() if key not in ROW_FIELDS}
+    data = {key: value for key, value in response_data.items() if key in ROW_FIELDS}
+    if not options.get("return_original", False):
+        # the uploaded rows are the bulk of a result page, they are only read and kept when asked for
+        data.pop("original_data", None)
+    pages = max(1, math.ceil(len(predictions) / page_rows_per_part))
+    # the result pages are written in the transaction that marks the job done, only while this worker owns it
+    heartbeat(db, job_id, *owner)
+    db.execute(delete(ScoringJobResult).where(ScoringJobResult.job_id == job_id))
+    for part in range(pages):
+        start = part * page_rows_per_part
+        page = page_rows(data, start, start + page_rows_per_part)
+        db.add(ScoringJobResult(job_id=job_id, part=part, rows=len(page["predictions"]), data=page))
+    if not finish_job(db, job_id, DONE, rows=len(predictions), summary=summary, pages=pages, owner=owner):
+        raise JobLostError(f"Job {job_id} was handed to another worker")
+
+def merge_result(summary, parts) -> dict:
+
+    return {**(summary or {}), **merge_pages(parts)}
+
+def work(worker_id=None, stop_event=None, on_stored=None, poll_interval: float = JOB_POLL_INTERVAL):
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stop_event = stop_event or threading.Event()
+    print(f"[INFO] Scoring worker {worker_id} started")
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            job = claim_job(db, worker_id)
+            if job is not None:
+                job_id, owner = job.id, (job.worker, job.attempts)
+                print(f"[INFO] Worker {worker_id} scoring job {job_id} (attempt {job.attempts})")
+                try:
+                    run_job(db, job, on_stored)
+                except JobLostError as e:
+                    db.rollback()
+                    print(f"[WARNING] {str(e)}, dropping this worker's run")
+                except SchemaError as e:
+                    db.rollback()
+                    finish_job(db, job_id, FAILED, error=str(e), owner=owner)
+                except Exception as e:
+                    db.rollback()
+                    traceback.print_exc()
+                    finish_job(db, job_id, FAILED, error=f"Error processing upload: {str(e)}", owner=owner)
+        except Exception as e:
+            job = None
+            print(f"[ERROR] Scoring worker {worker_id} failed to poll the queue: {str(e)}")
+        finally:
+            db.close()
+        if job is None:
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
+    print(f"[INFO] Scoring worker {worker_id} stopped")
+
+def start_embedded_workers(count: int = EMBEDDED_SCORING_WORKERS, on_stored=None):
+
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(
+            target=work, args=(f"{socket.gethostname()}:{os.getpid()}:{i}", stop_event, on_stored),
+            name=f"scoring-worker-{i}", daemon=True
+        )
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return stop_event
+
+def stop_embedded_workers(stop_event):
+
+    stop_event.set()
+    _wakeup.set()
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Score queued uploads, on this node or any node sharing the database")
+    parser.add_argument("--workers", type=int, default=SCORING_WORKERS, help="Scoring processes")
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL, help="Seconds between queue polls when idle")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        work(poll_interval=args.poll_interval)
+        return
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=work, kwargs={"poll_interval": args.poll_interval}) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
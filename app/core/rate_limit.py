@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Sequence
+
+
+# 0 turns the limiter off
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))
+LOGIN_BURST = int(os.getenv("LOGIN_BURST", "5"))
+# monitors behind one NAT share an address, so the per-IP bucket is looser than the per-username one
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "30"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class TokenBucketLimiter:
+
+    def __init__(self, rate_per_second: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.rate_per_second = rate_per_second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, keys: Sequence[tuple]) -> float:
+
+        # keys are (name, burst) pairs, a token is taken from every bucket or from none,
+        # otherwise the seconds until all of them have one again are returned
+        if self.rate_per_second <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, burst in keys:
+                tokens, updated = self._buckets.get(key, (float(burst), now))
+                levels.append(min(float(burst), tokens + (now - updated) * self.rate_per_second))
+
+            if all(level >= 1 for level in levels):
+                for (key, _), level in zip(keys, levels):
+                    self._buckets[key] = (level - 1, now)
+                    self._buckets.move_to_end(key)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                return 0.0
+
+            self.rejected += 1
+            return max((1 - level) / self.rate_per_second for level in levels if level < 1)
+
+
+login_limiter = TokenBucketLimiter(LOGIN_RATE_PER_MINUTE / 60)
+
+
+def login_keys(username: str, client_ip: str) -> list:
+    return [(f"user:{username.strip().lower()}", LOGIN_BURST), (f"ip:{client_ip}", LOGIN_IP_BURST)]
+
+def register_keys(client_ip: str) -> list:
+    return [(f"register:{client_ip}", LOGIN_BURST)]
@@ -0,0 +1,226 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+import joblib
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select, update
+
+from .database import SessionLocal, TrafficLog, TrafficTalker, Workspace
+from . import feature_store
+from .talkers import talker_moves, talker_upsert
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from schema import SchemaError, resolve_schema
+import model_store
+
+
+DEFAULT_PIPELINE_PATH = model_store.active_pipeline_path(os.path.join(APP_DIR, "main_pipeline.pkl"))[1]
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", str(os.cpu_count() or 1)))
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "50000"))
+CHECKPOINT_DIR = os.getenv("RESCORE_CHECKPOINT_DIR", ".")
+
+_worker_pipeline = None
+
+
+def _init_worker(pipeline_path):
+
+    # each worker unpickles the pipeline once and keeps it for every unit it scores
+    global _worker_pipeline
+    _worker_pipeline = joblib.load(pipeline_path)
+
+def _score_frame(frame: pd.DataFrame) -> list:
+
+    labels = [None] * len(frame)
+    if len(frame) == 0:
+        return labels
+    plan = resolve_schema(frame.columns, _worker_pipeline.cleaning_pipeline.final_features).validate()
+    features = np.empty((len(frame), len(plan.feature_columns)), dtype=np.float32)
+    for j, column in enumerate(plan.feature_columns):
+        features[:, j] = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float32)
+    # rows the cleaning step would have dropped keep their old status
+    finite = np.flatnonzero(np.isfinite(features).all(axis=1))
+    if len(finite):
+        predictions = _worker_pipeline.predict_cleaned(np.ascontiguousarray(features[finite]), copy=False)
+        for position, label in zip(finite, predictions):
+            labels[position] = str(label)
+    return labels
+
+def _score_batch(workspace_id, batch_id, batch_rows):
+
+    try:
+        frame = feature_store.read_batch(workspace_id, batch_id)
+    except FileNotFoundError:
+        return [None] * len(batch_rows)
+    # the stored batch holds every kept row of the upload, logs point into it by position
+    frame = frame.iloc[np.asarray(batch_rows, dtype=np.int64)]
+    return _score_frame(frame)
+
+def _score_headers(headers):
+    return _score_frame(pd.DataFrame.from_records(headers))
+
+def pipeline_fingerprint(pipeline_path) -> str:
+
+    stat = os.stat(pipeline_path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+def checkpoint_path_for(workspace_id) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"rescore_workspace_{workspace_id}.json")
+
+def load_checkpoint(path, workspace_id, fingerprint) -> dict:
+
+    fresh = {"workspace_id": workspace_id, "pipeline": fingerprint, "done_batches": [], "legacy_after": 0, "rows": 0, "changed": 0}
+    if not os.path.exists(path):
+        return fresh
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("pipeline") != fingerprint:
+        print(f"[INFO] Checkpoint {path} was written for another model, starting over")
+        return fresh
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def _batch_units(db, workspace_id, done_batches):
+
+    batch_ids = db.execute(
+        select(TrafficLog.batch_id)
+        .where(TrafficLog.workspace_id == workspace_id, TrafficLog.batch_id.is_not(None))
+        .group_by(TrafficLog.batch_id)
+        .order_by(TrafficLog.batch_id)
+    ).scalars().all()
+    for batch_id in batch_ids:
+        if batch_id in done_batches:
+            continue
+        rows = db.execute(
+            select(TrafficLog.id, TrafficLog.batch_row, TrafficLog.status,
+                   TrafficLog.source_ip, TrafficLog.destination_ip, TrafficLog.timestamp)
+            .where(TrafficLog.workspace_id == workspace_id, TrafficLog.batch_id == batch_id)
+        ).all()
+        yield ("batch", batch_id, rows)
+
+def _legacy_units(db, workspace_id, after_id, chunk_size):
+
+    # uploads from before the feature store kept the raw row as JSON in headers
+    while True:
+        rows = db.execute(
+            select(TrafficLog.id, TrafficLog.headers, TrafficLog.status,
+                   TrafficLog.source_ip, TrafficLog.destination_ip, TrafficLog.timestamp)
+            .where(
+                TrafficLog.workspace_id == workspace_id,
+                TrafficLog.batch_id.is_(None),
+                TrafficLog.headers.is_not(None),
+                TrafficLog.id > after_id
+            )
+            .order_by(TrafficLog.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        after_id = rows[-1].id
+        yield ("legacy", after_id, rows)
+
+def _submit(executor, workspace_id, unit):
+
+    kind, key, rows = unit
+    if kind == "batch":
+        return executor.submit(_score_batch, workspace_id, key, [row.batch_row for row in rows])
+    return executor.submit(_score_headers, [row.headers for row in rows])
+
+def rescore_workspace(workspace_id, pipeline_path=DEFAULT_PIPELINE_PATH, workers=RESCORE_WORKERS,
+                      chunk_size=RESCORE_CHUNK_SIZE, checkpoint_path=None, restart=False) -> dict:
+
+    checkpoint_path = checkpoint_path or checkpoint_path_for(workspace_id)
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path, workspace_id, pipeline_fingerprint(pipeline_path))
+    done_batches = set(checkpoint["done_batches"])
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    rows_scored = 0
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(pipeline_path,)) as executor:
+            units = _batch_units(db, workspace_id, done_batches)
+            legacy = _legacy_units(db, workspace_id, checkpoint["legacy_after"], chunk_size)
+            in_flight = deque()
+            for unit in chain(units, legacy, [None]):
+                if unit is not None:
+                    in_flight.append((unit, _submit(executor, workspace_id, unit)))
+                # results are applied in submission order so the checkpoint only ever moves forward
+                while in_flight and (unit is None or len(in_flight) >= workers * 2):
+                    (kind, key, rows), future = in_flight.popleft()
+                    labels = future.result()
+                    moves = [(row, label) for row, label in zip(rows, labels) if label is not None and label != row.status]
+                    changes = [{"id": row.id, "status": label} for row, label in moves]
+                    if changes:
+                        db.execute(update(TrafficLog), changes)
+                        db.execute(talker_upsert(), talker_moves(workspace_id, moves))
+                    db.commit()
+
+                    if kind == "batch":
+                        checkpoint["done_batches"].append(key)
+                    else:
+                        checkpoint["legacy_after"] = key
+                    checkpoint["rows"] += len(rows)
+                    checkpoint["changed"] += len(changes)
+                    save_checkpoint(checkpoint_path, checkpoint)
+
+                    rows_scored += len(rows)
+                    elapsed = time.perf_counter() - start
+                    print(f"[INFO] Workspace {workspace_id}: {rows_scored} rows rescored, {len(changes)} changed in this {kind} unit, {rows_scored / elapsed:,.0f} rows/s")
+        # counters whose every row moved to another label
+        db.execute(delete(TrafficTalker).where(TrafficTalker.workspace_id == workspace_id, TrafficTalker.count <= 0))
+        db.commit()
+    except SchemaError as e:
+        print(f"[ERROR] Stored flows for workspace {workspace_id} cannot be rescored: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] Workspace {workspace_id} done: {checkpoint['rows']} rows, {checkpoint['changed']} statuses changed, {rows_scored / elapsed if elapsed else 0:,.0f} rows/s this run")
+    return checkpoint
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Re-score stored traffic logs with the current main pipeline")
+    parser.add_argument("--workspace", type=int, action="append", help="Workspace id (repeatable, default: every workspace)")
+    parser.add_argument("--pipeline", default=DEFAULT_PIPELINE_PATH, help="Pickled MainPipeline to score with (default: the current model version)")
+    parser.add_argument("--workers", type=int, default=RESCORE_WORKERS, help="Scoring processes")
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE, help="Rows per unit for logs stored before the feature store")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints")
+    args = parser.parse_args()
+
+    workspace_ids = args.workspace
+    if not workspace_ids:
+        db = SessionLocal()
+        try:
+            workspace_ids = db.execute(select(Workspace.id).where(Workspace.deleted_at.is_(None))).scalars().all()
+        finally:
+            db.close()
+
+    for workspace_id in workspace_ids:
+        rescore_workspace(workspace_id, args.pipeline, args.workers, args.chunk_size, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from .database import (
+    DriftSketch, EvaluationReport, ScoringJob, ScoringJobResult, SessionLocal, TrafficLog, TrafficLogRollup, TrafficTalker, Workspace
+)
+from . import feature_store
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from drift import FeatureSketch
+
+
+TRAFFIC_LOG_RETENTION_DAYS = int(os.getenv("TRAFFIC_LOG_RETENTION_DAYS", "0"))
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", "0"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "50000"))
+# finished scoring jobs and their results are kept this long for polling clients
+JOB_RESULT_TTL_HOURS = int(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
+BENIGN_LABEL = "BENIGN"
+
+
+def period_of(moment: datetime) -> str:
+    return f"{moment:%Y%m}"
+
+def delete_in_chunks(db: Session, condition, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+
+    # short transactions, so uploads are not held behind the write lock for the whole delete
+    deleted = 0
+    while True:
+        chunk = select(TrafficLog.id).where(condition).limit(chunk_size)
+        result = db.execute(delete(TrafficLog).where(TrafficLog.id.in_(chunk)))
+        db.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return deleted
+
+def drop_expired_partitions(db: Session, retention_days: int = TRAFFIC_LOG_RETENTION_DAYS, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+
+    if retention_days <= 0:
+        return 0
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    # only whole periods that ended before the cutoff are dropped
+    cutoff_period = period_of(cutoff)
+    # both conditions are range scans of ix_traffic_logs_period, rows from before the period column by their timestamp
+    dropped = delete_in_chunks(db, TrafficLog.period < cutoff_period, chunk_size)
+    dropped += delete_in_chunks(db, and_(
+        TrafficLog.period.is_(None),
+        TrafficLog.timestamp < cutoff.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    ), chunk_size)
+    db.execute(delete(DriftSketch).where(DriftSketch.period < cutoff_period))
+    db.execute(delete(TrafficTalker).where(TrafficTalker.bucket < f"{cutoff:%Y-%m}-01 00"))
+    db.commit()
+    dropped_dirs = feature_store.drop_periods_before(cutoff_period)
+    print(f"[INFO] Retention dropped {dropped} log rows and {dropped_dirs} feature partitions before {cutoff_period}")
+    return dropped
+
+def compact_benign_logs(db: Session, compact_after_days: int = COMPACT_AFTER_DAYS, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+
+    if compact_after_days <= 0:
+        return 0
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=compact_after_days)
+    expired = and_(TrafficLog.status == BENIGN_LABEL, TrafficLog.timestamp < cutoff)
+    day = func.strftime("%Y-%m-%d", TrafficLog.timestamp) if db.bind.dialect.name == "sqlite" \
+        else func.to_char(TrafficLog.timestamp, "YYYY-MM-DD")
+
+    compacted = 0
+    rollups = set()
+    while True:
+        # each chunk is counted and deleted in the same transaction, an interrupted run never counts a row twice
+        ids = db.execute(select(TrafficLog.id).where(expired).limit(chunk_size)).scalars().all()
+        if not ids:
+            break
+        totals = db.execute(
+            select(TrafficLog.workspace_id, day.label("day"), TrafficLog.status, func.count(TrafficLog.id))
+            .where(TrafficLog.id.in_(ids))
+            .group_by(TrafficLog.workspace_id, day, TrafficLog.status)
+        ).all()
+
+        for workspace_id, bucket, status, count in totals:
+            updated = db.execute(
+                update(TrafficLogRollup)
+                .where(
+                    TrafficLogRollup.workspace_id == workspace_id,
+                    TrafficLogRollup.day == bucket,
+                    TrafficLogRollup.status == status
+                )
+                .values(count=TrafficLogRollup.count + count)
+            )
+            if updated.rowcount == 0:
+                db.add(TrafficLogRollup(workspace_id=workspace_id, day=bucket, status=status, count=count))
+            rollups.add((workspace_id, bucket, status))
+
+        result = db.execute(delete(TrafficLog).where(TrafficLog.id.in_(ids)))
+        db.commit()
+        compacted += result.rowcount
+        if len(ids) < chunk_size:
+            break
+
+    print(f"[INFO] Compacted {compacted} benign log rows into {len(rollups)} rollups")
+    return compacted
+
+def compact_drift_sketches(db: Session) -> int:
+
+    # one sketch per upload is merged into one per workspace, month and baseline
+    groups = db.execute(
+        select(DriftSketch.workspace_id, DriftSketch.period, DriftSketch.baseline)
+        .group_by(DriftSketch.workspace_id, DriftSketch.period, DriftSketch.baseline)
+        .having(func.count(DriftSketch.id) > 1)
+    ).all()
+    merged_rows = 0
+    for workspace_id, period, baseline in groups:
+        rows = db.execute(
+            select(DriftSketch.id, DriftSketch.sketch).where(
+                DriftSketch.workspace_id == workspace_id,
+                DriftSketch.period == period,
+                DriftSketch.baseline == baseline
+            )
+        ).all()
+        merged = FeatureSketch.from_bytes(rows[0].sketch)
+        for row in rows[1:]:
+            merged = merged.merge(FeatureSketch.from_bytes(row.sketch))
+        db.execute(delete(DriftSketch).where(DriftSketch.id.in_([row.id for row in rows])))
+        db.add(DriftSketch(workspace_id=workspace_id, period=period, baseline=baseline, rows=merged.count, sketch=merged.to_bytes()))
+        db.commit()
+        merged_rows += len(rows)
+    if groups:
+        print(f"[INFO] Compacted {merged_rows} drift sketches into {len(groups)}")
+    return merged_rows
+
+def expire_finished_jobs(db: Session, ttl_hours: int = JOB_RESULT_TTL_HOURS) -> int:
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=ttl_hours)
+    expired = select(ScoringJob.id).where(ScoringJob.status.in_(("done", "failed")), ScoringJob.finished_at < cutoff)
+    db.execute(delete(ScoringJobResult).where(ScoringJobResult.job_id.in_(expired)))
+    result = db.execute(delete(ScoringJob).where(ScoringJob.id.in_(expired)))
+    db.commit()
+    if result.rowcount:
+        print(f"[INFO] Removed {result.rowcount} finished scoring jobs")
+    return result.rowcount
+
+def purge_deleted_workspaces(db: Session, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+
+    workspace_ids = db.execute(select(Workspace.id).where(Workspace.deleted_at.is_not(None))).scalars().all()
+    for workspace_id in workspace_ids:
+        delete_in_chunks(db, TrafficLog.workspace_id == workspace_id, chunk_size)
+        db.execute(delete(TrafficLogRollup).where(TrafficLogRollup.workspace_id == workspace_id))
+        db.execute(delete(DriftSketch).where(DriftSketch.workspace_id == workspace_id))
+        db.execute(delete(TrafficTalker).where(TrafficTalker.workspace_id == workspace_id))
+        db.execute(delete(EvaluationReport).where(EvaluationReport.workspace_id == workspace_id))
+        jobs = select(ScoringJob.id).where(ScoringJob.workspace_id == workspace_id)
+        db.execute(delete(ScoringJobResult).where(ScoringJobResult.job_id.in_(jobs)))
+        db.execute(delete(ScoringJob).where(ScoringJob.workspace_id == workspace_id))
+        db.execute(delete(Workspace).where(Workspace.id == workspace_id))
+        db.commit()
+        feature_store.delete_workspace(workspace_id)
+        print(f"[INFO] Purged deleted workspace {workspace_id}")
+    return len(workspace_ids)
+
+def purge_deleted():
+
+    db = SessionLocal()
+    try:
+        purge_deleted_workspaces(db)
+    finally:
+        db.close()
+
+def run_maintenance():
+
+    db = SessionLocal()
+    try:
+        purge_deleted_workspaces(db)
+        drop_expired_partitions(db)
+        compact_benign_logs(db)
+        compact_drift_sketches(db)
+        expire_finished_jobs(db)
+    finally:
+        db.close()
+
+async def maintenance_loop(interval: int = RETENTION_INTERVAL_SECONDS):
+
+    while True:
+        try:
+            await asyncio.to_thread(run_maintenance)
+        except Exception as e:
+            print(f"[ERROR] Traffic log maintenance failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    run_maintenance()
+    sys.exit(0)
@@ -0,0 +1,93 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .database import TrafficTalker, engine
+
+
+BENIGN_LABEL = "BENIGN"
+TALKER_COLUMNS = {"source": TrafficTalker.source_ip, "destination": TrafficTalker.destination_ip}
+
+
+def bucket_of(moment: datetime) -> str:
+
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return f"{moment:%Y-%m-%d %H}"
+
+def talker_counts(workspace_id, rows, moment=None) -> list:
+
+    # one row per (hour, source, destination, label) instead of one per flow
+    bucket = bucket_of(moment or datetime.now(timezone.utc))
+    counts = Counter((row["source_ip"], row["destination_ip"], row["status"]) for row in rows)
+    return [
+        {
+            "workspace_id": workspace_id,
+            "bucket": bucket,
+            "source_ip": source_ip,
+            "destination_ip": destination_ip,
+            "status": status,
+            "count": count
+        }
+        for (source_ip, destination_ip, status), count in counts.items()
+    ]
+
+def talker_moves(workspace_id, moves) -> list:
+
+    # relabelled logs move their count from the old label to the new one, in the hour they were stored
+    deltas = Counter()
+    for row, status in moves:
+        bucket = bucket_of(row.timestamp or datetime.now(timezone.utc))
+        deltas[(bucket, row.source_ip, row.destination_ip, row.status)] -= 1
+        deltas[(bucket, row.source_ip, row.destination_ip, status)] += 1
+    return [
+        {
+            "workspace_id": workspace_id,
+            "bucket": bucket,
+            "source_ip": source_ip,
+            "destination_ip": destination_ip,
+            "status": status,
+            "count": count
+        }
+        for (bucket, source_ip, destination_ip, status), count in deltas.items()
+        if count
+    ]
+
+def talker_upsert():
+
+    # adds to the existing counters, so callers only ever send the rows they just stored
+    dialect = sqlite if engine.dialect.name == "sqlite" else postgresql
+    statement = dialect.insert(TrafficTalker)
+    return statement.on_conflict_do_update(
+        index_elements=["workspace_id", "bucket", "source_ip", "destination_ip", "status"],
+        set_={"count": TrafficTalker.count + statement.excluded["count"]}
+    )
+
+def top_talkers_query(workspace_id, by="source", limit=10, since=None, until=None, status=None):
+
+    column = TALKER_COLUMNS[by]
+    total = func.sum(TrafficTalker.count).label("count")
+    query = select(column.label("ip"), total).where(TrafficTalker.workspace_id == workspace_id)
+    if since is not None:
+        query = query.where(TrafficTalker.bucket >= bucket_of(since))
+    if until is not None:
+        query = query.where(TrafficTalker.bucket <= bucket_of(until))
+    if status is None:
+        query = query.where(TrafficTalker.status != BENIGN_LABEL)
+    elif status != "all":
+        query = query.where(TrafficTalker.status == status)
+    return query.group_by(column).having(total > 0).order_by(total.desc()).limit(limit)
+
+def label_breakdown_query(workspace_id, ips, by="source", since=None, until=None):
+
+    column = TALKER_COLUMNS[by]
+    query = select(column, TrafficTalker.status, func.sum(TrafficTalker.count)).where(
+        TrafficTalker.workspace_id == workspace_id, column.in_(ips)
+    )
+    if since is not None:
+        query = query.where(TrafficTalker.bucket >= bucket_of(since))
+    if until is not None:
+        query = query.where(TrafficTalker.bucket <= bucket_of(until))
+    return query.group_by(column, TrafficTalker.status)
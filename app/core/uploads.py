@@ -0,0 +1,244 @@
+import io
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .database import DriftSketch, EvaluationReport, TrafficLog
+from .events import broker
+from .retention import period_of
+from .talkers import talker_counts, talker_upsert
+from . import feature_store
+from ..inference import engine as inference
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from schema import header_from_text
+from flow_reader import columnar_header, read_flow_columnar, read_flow_text, read_original
+
+
+MAX_EVENT_ROWS = 500
+# rows scored below this attack probability are returned but not written to traffic_logs
+MIN_ATTACK_PROBABILITY = float(os.getenv("MIN_ATTACK_PROBABILITY", "0"))
+
+
+def rounded(values, decimals=4):
+
+    return np.round(np.asarray(values, dtype=np.float64), decimals).tolist()
+
+def option_flag(value) -> bool:
+
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+def upload_plan(payload, file_format, keep_label=False):
+
+    if file_format == "csv":
+        return inference.column_plan(header_from_text(payload), keep_label)
+    return inference.column_plan(columnar_header(io.BytesIO(payload), file_format), keep_label)
+
+def original_rows(payload, file_format, kept_index, drop=()) -> list:
+
+    # the model reads float32 copies of the planned columns, the response echoes what was uploaded
+    source = payload if file_format == "csv" else io.BytesIO(payload)
+    rows = read_original(source, file_format).iloc[kept_index]
+    rows = rows.drop(columns=[column for column in drop if column in rows.columns])
+    return rows.astype(object).where(rows.notna(), None).to_dict(orient='records')
+
+def score_upload(payload, file_format, plan, top_k=None, return_proba=False, evaluate=False, chunk_rows=None,
+                 on_progress=None, return_original=True):
+
+    # read once, straight from the request body, with only the planned columns
+    main_pipeline = inference.get_pipeline()
+    final_features = main_pipeline.cleaning_pipeline.final_features
+    if file_format == "csv":
+        df, _ = read_flow_text(payload, final_features, plan=plan)
+    else:
+        df, _ = read_flow_columnar(io.BytesIO(payload), file_format, final_features, plan=plan)
+    if on_progress is not None:
+        on_progress("parsed", len(df))
+    sketches = []
+    predictions, proba, kept_index = inference.process_frame(
+        df, return_index=True, return_proba=True,
+        on_cleaned=lambda pipeline, features: sketches.append(inference.drift_sketch(pipeline, features)),
+        chunk_rows=chunk_rows, on_progress=on_progress
+    )
+
+    scores = {"attack_probability": main_pipeline.attack_probability(proba), "drift_sketch": sketches[0] if sketches else None}
+    if evaluate:
+        scores["evaluation"] = inference.evaluate(df, predictions, kept_index)
+        # the ground truth is only read to be compared, it is neither returned nor stored with the flows
+        if plan.label in df.columns:
+            df = df.drop(columns=[plan.label])
+    kept_rows = df.iloc[kept_index]
+    if top_k:
+        labels, top_scores = main_pipeline.top_k(proba, int(top_k))
+        scores["top_k"] = {"labels": labels.tolist(), "scores": rounded(top_scores)}
+    if return_proba:
+        classes = main_pipeline.classes if main_pipeline.classes is not None else np.arange(proba.shape[1])
+        scores["probabilities"] = {"classes": classes.tolist(), "values": rounded(proba)}
+    dropped = [plan.label] if evaluate and plan.label else []
+    original_data = original_rows(payload, file_format, kept_index, dropped) if return_original else []
+    return predictions, scores, kept_rows, original_data
+
+def upload_response(predictions_list, original_data, scores, evaluate, timestamp):
+
+    response_data = {
+        "status": "success",
+        "predictions": predictions_list,
+        "original_data": original_data,
+        "timestamp": timestamp
+    }
+    if "top_k" in scores:
+        response_data["top_k"] = scores["top_k"]
+    if "probabilities" in scores:
+        response_data["probabilities"] = scores["probabilities"]
+        attack_probability = scores["attack_probability"]
+        # null for every row when the model has no benign class, JSON has no NaN
+        response_data["attack_probability"] = [None] * len(attack_probability) if np.isnan(attack_probability).any() \
+            else rounded(attack_probability)
+    if evaluate:
+        response_data["evaluation"] = scores["evaluation"]
+    return response_data
+
+def build_log_rows(user_id, workspace_id, predictions_list, kept_rows, plan):
+
+    # the feature store is kept per workspace, rows uploaded without one only keep their flow identity
+    if workspace_id:
+        batch_id = feature_store.write_batch(workspace_id, kept_rows)
+        print(f"[INFO] Stored raw flow features as batch {batch_id}")
+        period = feature_store.batch_period(batch_id)
+    else:
+        batch_id, period = None, period_of(datetime.now(timezone.utc))
+    identity = plan.flow_identity(kept_rows)
+    stored_rows = [
+        {
+            "source_ip": source_ip,
+            "destination_ip": destination_ip,
+            "protocol": protocol,
+            "status": str(pred)
+        }
+        for source_ip, destination_ip, protocol, pred in zip(
+            identity["source_ip"], identity["destination_ip"], identity["protocol"], predictions_list
+        )
+    ]
+    log_rows = [
+        dict(
+            stored_row,
+            user_id=user_id,
+            workspace_id=workspace_id,
+            batch_id=batch_id,
+            batch_row=i if batch_id else None,
+            period=period
+        )
+        for i, stored_row in enumerate(stored_rows)
+    ]
+    return stored_rows, log_rows
+
+def with_log_ids(stored_rows, log_ids) -> list:
+
+    # live detections carry their log id, so the logs page can fetch their flow features
+    return [dict(row, id=log_id) for row, log_id in zip(stored_rows, log_ids)]
+
+def discard_batch(workspace_id, log_rows):
+
+    # the logs pointing at a batch were not stored, so nothing would ever read or expire its file
+    batch_id = log_rows[0]["batch_id"] if log_rows else None
+    if batch_id:
+        feature_store.delete_batch(workspace_id, batch_id)
+
+def rows_to_log(predictions_list, kept_rows, scores, min_attack_probability):
+
+    if min_attack_probability <= 0:
+        return predictions_list, kept_rows
+    if np.isnan(scores["attack_probability"]).any():
+        # without a benign class nothing can be filtered, storing everything is safer than storing nothing
+        print(f"[WARNING] The model has no benign class, min_attack_probability {min_attack_probability} ignored and all {len(predictions_list)} rows persisted")
+        return predictions_list, kept_rows
+    persist = np.flatnonzero(scores["attack_probability"] >= min_attack_probability)
+    print(f"[INFO] Persisting {len(persist)} of {len(predictions_list)} rows with attack probability >= {min_attack_probability}")
+    return [predictions_list[i] for i in persist], kept_rows.iloc[persist]
+
+def drift_sketch_values(workspace_id, scores):
+
+    baseline_id, sketch = scores["drift_sketch"]
+    return dict(
+        workspace_id=workspace_id,
+        period=period_of(datetime.now(timezone.utc)),
+        baseline=baseline_id,
+        rows=sketch.count,
+        sketch=sketch.to_bytes()
+    )
+
+def evaluation_values(workspace_id, user_id, report):
+
+    return dict(
+        workspace_id=workspace_id,
+        user_id=user_id,
+        model_version=report["model_version"],
+        rows=report["rows"],
+        labelled_rows=report["labelled_rows"],
+        accuracy=report["accuracy"],
+        classes=report["classes"],
+        confusion_matrix=report["confusion_matrix"],
+        per_class=report["per_class"]
+    )
+
+def store_upload(db: Session, user_id, workspace_id, plan, predictions_list, kept_rows, scores, min_attack_probability, guard=None):
+
+    # the same writes as /direct-process, for callers holding a synchronous session.
+    # guard runs inside each transaction before it commits, and raises to abandon it
+    def commit():
+        if guard is not None:
+            guard()
+        db.commit()
+
+    stored_rows = []
+    log_predictions, log_kept_rows = rows_to_log(predictions_list, kept_rows, scores, min_attack_probability)
+    if user_id and len(log_predictions) > 0:
+        stored_rows, log_rows = build_log_rows(user_id, workspace_id, log_predictions, log_kept_rows, plan)
+        try:
+            log_ids = db.execute(insert(TrafficLog).returning(TrafficLog.id, sort_by_parameter_order=True), log_rows).scalars().all()
+            stored_rows = with_log_ids(stored_rows, log_ids)
+            if workspace_id:
+                db.execute(talker_upsert(), talker_counts(workspace_id, stored_rows))
+            commit()
+        except Exception:
+            db.rollback()
+            discard_batch(workspace_id, log_rows)
+            raise
+
+    # every scored row feeds the drift sketch, including the ones not persisted
+    if user_id and workspace_id and scores["drift_sketch"] is not None:
+        db.execute(insert(DriftSketch).values(**drift_sketch_values(workspace_id, scores)))
+        commit()
+    if user_id and workspace_id and scores.get("evaluation"):
+        db.execute(insert(EvaluationReport).values(**evaluation_values(workspace_id, user_id, scores["evaluation"])))
+        commit()
+    return stored_rows
+
+def publish_detections(workspace_id, rows, timestamp):
+
+    if not broker.subscriber_count(workspace_id):
+        return
+
+    counts = {}
+    attacks = []
+    for row in rows:
+        status = row["status"]
+        counts[status] = counts.get(status, 0) + 1
+        if status != "BENIGN" and len(attacks) < MAX_EVENT_ROWS:
+            attacks.append(dict(row, timestamp=timestamp))
+
+    broker.publish(workspace_id, "counts", {"counts": counts})
+    if attacks:
+        broker.publish(workspace_id, "detections", {
+            "rows": attacks,
+            "total": sum(n for status, n in counts.items() if status != "BENIGN")
+        })
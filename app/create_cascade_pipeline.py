@@ -0,0 +1,36 @@
+import os
+import sys
+import joblib
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from data_cleaning_pipeline import DataCleaningPipeline
+from main_pipeline import MainPipeline
+from labels import map_attack_types
+from cascade import fit_cascade, choose_threshold, CASCADE_TARGET_RECALL
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.inference.builder import dump_atomic
+
+if len(sys.argv) < 2:
+    print("Usage: python create_cascade_pipeline.py <labelled_csv> [target_attack_recall]")
+    sys.exit(1)
+
+target_recall = float(sys.argv[2]) if len(sys.argv) > 2 else CASCADE_TARGET_RECALL
+
+main_pipeline = joblib.load('main_pipeline.pkl')
+data = pd.read_csv(sys.argv[1])
+data.columns = data.columns.str.strip()
+
+X = main_pipeline.cleaning_pipeline.transform_with_index(data)
+y = map_attack_types(data['Label'].iloc[X.index]).to_numpy()
+
+X_fit, X_val, y_fit, y_val = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+cascade_model = fit_cascade(X_fit, y_fit)
+threshold = choose_threshold(cascade_model, X_val, y_val, target_recall)
+if threshold is None:
+    print("The main pipeline was left unchanged")
+    sys.exit(1)
+
+main_pipeline.enable_cascade(cascade_model, threshold)
+# the server reloads main_pipeline.pkl when it changes, it must never see a half written file
+dump_atomic(main_pipeline, 'main_pipeline.pkl')
+print(f"Cascade enabled with threshold {threshold:.4f}, main pipeline pickled successfully!")
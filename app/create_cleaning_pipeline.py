@@ -1,5 +1,7 @@
-import joblib
-from data_cleaning_pipeline import DataCleaningPipeline
-cleaning_pipeline = DataCleaningPipeline()
-joblib.dump(cleaning_pipeline, 'cleaning_pipeline.pkl')
-print("cleaning pipeline pickled successfully!")
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.inference.builder import build_cleaning_pipeline
+
+build_cleaning_pipeline()
@@ -0,0 +1,25 @@
+import sys
+import joblib
+import numpy as np
+from main_pipeline import MainPipeline
+from flow_reader import read_flow_file
+from drift import DriftBaseline, DRIFT_BINS, DRIFT_BASELINE_PATH
+
+if len(sys.argv) < 2:
+    print("Usage: python create_drift_baseline.py <training_csv|parquet|arrow> [more files...]")
+    sys.exit(1)
+
+main_pipeline = joblib.load('main_pipeline.pkl')
+final_features = main_pipeline.cleaning_pipeline.final_features
+
+# the baseline is binned on the same cleaned float32 matrix the server sketches
+features = []
+for path in sys.argv[1:]:
+    data, _ = read_flow_file(path, final_features)
+    cleaned, _ = main_pipeline.clean(data)
+    features.append(cleaned)
+    print(f"{path}: {len(cleaned)} cleaned rows")
+
+baseline = DriftBaseline.from_features(np.concatenate(features), final_features, DRIFT_BINS)
+baseline.save(DRIFT_BASELINE_PATH)
+print(f"Drift baseline of {baseline.count} rows saved to {DRIFT_BASELINE_PATH}")
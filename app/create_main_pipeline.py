@@ -1,13 +1,7 @@
-import pandas as pd
-import joblib
-from data_cleaning_pipeline import DataCleaningPipeline
-from main_pipeline import MainPipeline
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-cleaning_pipeline = joblib.load('cleaning_pipeline.pkl')
-model_pipeline = joblib.load("rf_pipeline_without_smote.pkl")
-
-
-main_pipeline = MainPipeline(cleaning_pipeline, model_pipeline)
-joblib.dump(main_pipeline, 'main_pipeline.pkl')
-print("Main pipeline pickled successfully!")
+from app.inference.builder import build_main_pipeline
 
+build_main_pipeline()
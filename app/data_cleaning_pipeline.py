@@ -1,6 +1,7 @@
 from sklearn.base import BaseEstimator, TransformerMixin
 import numpy as np
 import pandas as pd
+from schema import resolve_schema
 
 
 class DataCleaningPipeline(BaseEstimator, TransformerMixin):
@@ -29,6 +30,18 @@ class DataCleaningPipeline(BaseEstimator, TransformerMixin):
 
     def transform(self, X):
         
+        X = self.transform_with_index(X)
+        
+        
+        X = X.reset_index(drop=True)
+        
+        print(f"data cleaned! Cleaned Data \n {X.head()}")
+        print(f"feature names are: \n {X.columns}")
+        return X
+
+    def transform_with_index(self, X):
+        
+        # keeps the positional index of each surviving input row
         X = X.reset_index(drop=True)
         
         
@@ -37,19 +50,55 @@ class DataCleaningPipeline(BaseEstimator, TransformerMixin):
         X = self._replace_infinite_with_null(X)
         X = self._drop_nulls(X)
         X = self._filter_features(X)
+        return X
+
+    def transform_array(self, X):
         
-        
+        # same rows as transform_with_index, but the features come back as one C-contiguous float32 matrix
+        # built straight from the input columns, without renamed or filtered copies of the frame
         X = X.reset_index(drop=True)
+        plan = resolve_schema(X.columns, self.final_features).validate()
         
-        print(f"data cleaned! Cleaned Data \n {X.head()}")
-        print(f"feature names are: \n {X.columns}")
-        return X
+        columns = [X[column].to_numpy(dtype=np.float32, copy=False) for column in plan.feature_columns]
+        # the ground truth label, when it was read for evaluation, never decides which rows are scored
+        unlabelled = X.drop(columns=[plan.label]) if plan.label in X.columns else X
+        keep = ~self._duplicated_rows(unlabelled)
+        for values in columns:
+            keep &= np.isfinite(values)
+        skipped = set(plan.feature_columns) | {plan.label}
+        others = X[[column for column in X.columns if column not in skipped]]
+        if others.shape[1]:
+            keep &= others.notna().all(axis=1).to_numpy()
+            numeric = others.select_dtypes("number")
+            if numeric.shape[1]:
+                keep &= np.isfinite(numeric.to_numpy(dtype=np.float64)).all(axis=1)
+        
+        features = np.empty((int(keep.sum()), len(columns)), dtype=np.float32)
+        for j, values in enumerate(columns):
+            features[:, j] = values[keep]
+        return features, np.flatnonzero(keep)
 
     def _fix_column_names(self, df):
-        return df.rename(columns=lambda col: col.strip())
+        
+        # the plan is compiled once per distinct header and fails fast on missing features
+        plan = resolve_schema(df.columns, self.final_features).validate()
+        if not plan.rename:
+            return df
+        return df.rename(columns=plan.rename)
 
     def _drop_duplicates(self, df):
-        return df.drop_duplicates()
+        return df[~self._duplicated_rows(df)]
+
+    def _duplicated_rows(self, df):
+        
+        # hashing rows is far lighter than drop_duplicates' per-column factorizing,
+        # rows that share a hash are then compared exactly
+        hashes = pd.util.hash_pandas_object(df, index=False)
+        duplicated = np.zeros(len(df), dtype=bool)
+        suspects = hashes.duplicated(keep=False).to_numpy()
+        if suspects.any():
+            duplicated[suspects] = df[suspects].duplicated().to_numpy()
+        return duplicated
 
     def _replace_infinite_with_null(self, df):
         df.replace([np.inf, -np.inf], np.nan, inplace=True)
@@ -0,0 +1,219 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DRIFT_BASELINE_PATH = os.getenv("DRIFT_BASELINE_PATH", os.path.join(APP_DIR, "drift_baseline.json"))
+DRIFT_BINS = int(os.getenv("DRIFT_BINS", "20"))
+# the usual reading of the population stability index: < 0.1 stable, 0.1-0.25 moderate, > 0.25 shifted
+DRIFT_PSI_THRESHOLD = float(os.getenv("DRIFT_PSI_THRESHOLD", "0.25"))
+PSI_EPSILON = 1e-4
+
+_baseline = None
+_baseline_key = None
+_baseline_lock = threading.Lock()
+
+
+def _bin_counts(values, edges, n_bins) -> np.ndarray:
+    return np.bincount(np.searchsorted(edges, values, side="right"), minlength=n_bins)[:n_bins]
+
+
+class DriftBaseline:
+
+    def __init__(self, features, edges, counts, count, mean, std, baseline_id=None):
+        self.features = list(features)
+        self.edges = [np.asarray(feature_edges, dtype=np.float64) for feature_edges in edges]
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.count = int(count)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+        self.baseline_id = baseline_id
+
+    @property
+    def n_bins(self) -> int:
+        return self.counts.shape[1]
+
+    @classmethod
+    def from_features(cls, features, feature_names, bins: int = DRIFT_BINS):
+
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        edges, counts = [], np.zeros((len(feature_names), bins), dtype=np.int64)
+        for j in range(len(feature_names)):
+            values = features[:, j]
+            # discrete features (flags, ports) repeat quantiles, their bins collapse into fewer wider ones
+            feature_edges = np.unique(np.quantile(values.astype(np.float64), quantiles))
+            edges.append(feature_edges)
+            counts[j] = _bin_counts(values, feature_edges, bins)
+        mean = np.array([features[:, j].mean(dtype=np.float64) for j in range(len(feature_names))])
+        std = np.array([features[:, j].std(dtype=np.float64) for j in range(len(feature_names))])
+        return cls(feature_names, edges, counts, len(features), mean, std)
+
+    def to_dict(self) -> dict:
+
+        return {
+            "features": self.features,
+            "edges": [feature_edges.tolist() for feature_edges in self.edges],
+            "counts": self.counts.tolist(),
+            "count": self.count,
+            "mean": self.mean.tolist(),
+            "std": self.std.tolist(),
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def save(self, path=DRIFT_BASELINE_PATH):
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DRIFT_BASELINE_PATH):
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+        # sketches are only merged and compared against the exact baseline they were binned for
+        baseline_id = hashlib.sha256(raw).hexdigest()[:16]
+        return cls(data["features"], data["edges"], data["counts"], data["count"], data["mean"], data["std"], baseline_id)
+
+
+class FeatureSketch:
+
+    def __init__(self, count, mean, m2, minimum, maximum, counts):
+        self.count = int(count)
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+        self.counts = counts
+
+    @classmethod
+    def empty(cls, n_features, n_bins):
+
+        return cls(
+            0,
+            np.zeros(n_features),
+            np.zeros(n_features),
+            np.full(n_features, np.inf),
+            np.full(n_features, -np.inf),
+            np.zeros((n_features, n_bins), dtype=np.int64)
+        )
+
+    @classmethod
+    def from_features(cls, features, baseline: DriftBaseline):
+
+        # one pass per column over the cleaned float32 matrix, no float64 copy of the whole batch
+        sketch = cls.empty(features.shape[1], baseline.n_bins)
+        sketch.count = len(features)
+        if sketch.count == 0:
+            return sketch
+        for j in range(features.shape[1]):
+            values = features[:, j]
+            sketch.mean[j] = values.mean(dtype=np.float64)
+            sketch.m2[j] = values.var(dtype=np.float64) * sketch.count
+            sketch.minimum[j] = values.min()
+            sketch.maximum[j] = values.max()
+            sketch.counts[j] = _bin_counts(values, baseline.edges[j], baseline.n_bins)
+        return sketch
+
+    def merge(self, other):
+
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        # Chan et al. pairwise update, so per-batch sketches combine exactly in any order
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        return FeatureSketch(
+            count,
+            self.mean + delta * other.count / count,
+            self.m2 + other.m2 + delta ** 2 * self.count * other.count / count,
+            np.minimum(self.minimum, other.minimum),
+            np.maximum(self.maximum, other.maximum),
+            self.counts + other.counts
+        )
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.m2 / self.count) if self.count else np.zeros_like(self.m2)
+
+    def to_bytes(self) -> bytes:
+
+        buffer = io.BytesIO()
+        np.savez(buffer, count=self.count, mean=self.mean, m2=self.m2, minimum=self.minimum,
+                 maximum=self.maximum, counts=self.counts)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(int(arrays["count"]), arrays["mean"], arrays["m2"], arrays["minimum"],
+                       arrays["maximum"], arrays["counts"])
+
+
+def current_baseline(path=DRIFT_BASELINE_PATH):
+
+    global _baseline, _baseline_key
+    if not os.path.exists(path):
+        return None
+    key = (path, os.path.getmtime(path))
+    with _baseline_lock:
+        if key != _baseline_key:
+            _baseline = DriftBaseline.load(path)
+            _baseline_key = key
+            print(f"[INFO] Loaded drift baseline {_baseline.baseline_id} from {path}")
+        return _baseline
+
+def merge_sketches(blobs, baseline: DriftBaseline) -> FeatureSketch:
+
+    merged = FeatureSketch.empty(len(baseline.features), baseline.n_bins)
+    for blob in blobs:
+        merged = merged.merge(FeatureSketch.from_bytes(blob))
+    return merged
+
+def psi(expected_counts, actual_counts) -> np.ndarray:
+
+    # empty bins are floored so they add a bounded penalty instead of an infinite one
+    expected = np.maximum(expected_counts / np.maximum(expected_counts.sum(axis=-1, keepdims=True), 1), PSI_EPSILON)
+    actual = np.maximum(actual_counts / np.maximum(actual_counts.sum(axis=-1, keepdims=True), 1), PSI_EPSILON)
+    return ((actual - expected) * np.log(actual / expected)).sum(axis=-1)
+
+def drift_report(baseline: DriftBaseline, sketch: FeatureSketch, threshold: float = DRIFT_PSI_THRESHOLD) -> dict:
+
+    scores = psi(baseline.counts, sketch.counts) if sketch.count else np.zeros(len(baseline.features))
+    std = sketch.std
+    safe_std = np.where(baseline.std > 0, baseline.std, 1.0)
+    features = [
+        {
+            "feature": name,
+            "psi": float(scores[j]),
+            "mean": float(sketch.mean[j]),
+            "baseline_mean": float(baseline.mean[j]),
+            "mean_shift": float((sketch.mean[j] - baseline.mean[j]) / safe_std[j]),
+            "std": float(std[j]),
+            "baseline_std": float(baseline.std[j]),
+            "min": float(sketch.minimum[j]) if sketch.count else None,
+            "max": float(sketch.maximum[j]) if sketch.count else None
+        }
+        for j, name in enumerate(baseline.features)
+    ]
+    features.sort(key=lambda feature: feature["psi"], reverse=True)
+    return {
+        "baseline": baseline.baseline_id,
+        "rows": sketch.count,
+        "baseline_rows": baseline.count,
+        "max_psi": float(scores.max()) if len(scores) else 0.0,
+        "mean_psi": float(scores.mean()) if len(scores) else 0.0,
+        "threshold": threshold,
+        "drifted": [feature["feature"] for feature in features if feature["psi"] >= threshold],
+        "features": features
+    }
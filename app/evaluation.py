@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from labels import map_attack_types
+
+
+def true_labels(values) -> np.ndarray:
+
+    # the attack-type grouping is applied to the few distinct labels, rows only carry their codes
+    values = pd.Series(values, copy=False)
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    groups = map_attack_types(pd.Series(values.cat.categories)).to_numpy(dtype=object)
+    codes = values.cat.codes.to_numpy()
+    labels = np.full(len(codes), None, dtype=object)
+    present = codes >= 0
+    labels[present] = groups[codes[present]]
+    return labels
+
+def confusion_matrix(y_true, y_pred, classes=None):
+
+    y_true = np.asarray(y_true, dtype=object)
+    y_pred = np.asarray(y_pred, dtype=object)
+    labelled = pd.notna(y_true)
+    y_true, y_pred = y_true[labelled], y_pred[labelled]
+
+    # the model's classes first, then any label it can't predict (e.g. Exploits)
+    classes = [str(label) for label in (classes if classes is not None else [])]
+    seen = set(pd.unique(y_true).tolist()) | set(pd.unique(y_pred).tolist())
+    classes += sorted(str(label) for label in seen if str(label) not in classes)
+
+    n = len(classes)
+    true_codes = pd.Categorical(y_true.astype(str), categories=classes).codes.astype(np.int64)
+    pred_codes = pd.Categorical(y_pred.astype(str), categories=classes).codes.astype(np.int64)
+    matrix = np.bincount(true_codes * n + pred_codes, minlength=n * n).reshape(n, n)
+    return matrix, classes
+
+def per_class_metrics(matrix, classes) -> dict:
+
+    # read off the confusion matrix, a class never predicted (or never seen) has no precision (or recall)
+    hits = np.diag(matrix)
+    predicted = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+    return {
+        label: {
+            "precision": float(hits[i] / predicted[i]) if predicted[i] else None,
+            "recall": float(hits[i] / support[i]) if support[i] else None,
+            "support": int(support[i])
+        }
+        for i, label in enumerate(classes)
+    }
+
+def evaluation_report(y_true, y_pred, classes=None) -> dict:
+
+    matrix, classes = confusion_matrix(y_true, y_pred, classes)
+    labelled = int(matrix.sum())
+    return {
+        "rows": len(y_pred),
+        "labelled_rows": labelled,
+        "accuracy": float(np.trace(matrix) / labelled) if labelled else None,
+        "classes": classes,
+        "confusion_matrix": matrix.tolist(),
+        "per_class": per_class_metrics(matrix, classes)
+    }
@@ -0,0 +1,95 @@
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import header_from_text, read_header, resolve_schema
+
+
+# "c" is pandas' default parser, "pyarrow" parses with several threads
+FLOW_CSV_ENGINE = os.getenv("FLOW_CSV_ENGINE", "c")
+
+FLOW_FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+
+def read_flow_csv(file_path, final_features, engine=None, plan=None, keep_label=False):
+    
+    if plan is None:
+        plan = resolve_schema(read_header(file_path), final_features, keep_label)
+    return _read_planned(file_path, plan, engine), plan
+
+def read_flow_text(csv_text, final_features, engine=None, plan=None, keep_label=False):
+    
+    if plan is None:
+        plan = resolve_schema(header_from_text(csv_text), final_features, keep_label)
+    engine = engine or FLOW_CSV_ENGINE
+    source = io.BytesIO(csv_text.encode("utf-8")) if engine == "pyarrow" else io.StringIO(csv_text)
+    return _read_planned(source, plan, engine), plan
+
+def _read_planned(source, plan, engine):
+    
+    # only the feature and flow identity columns are parsed, with their dtypes declared up front
+    plan.validate()
+    return pd.read_csv(source, usecols=list(plan.usecols), dtype=plan.dtypes, engine=engine or FLOW_CSV_ENGINE)
+
+def read_original(source, file_format="csv"):
+    
+    # every column with the dtypes pandas infers, to echo an upload back the way it was sent
+    if file_format == "csv":
+        return pd.read_csv(io.StringIO(source) if isinstance(source, str) else source)
+    if file_format == "parquet":
+        return pq.read_table(source).to_pandas()
+    return _open_ipc(source).read_all().to_pandas()
+
+def flow_format(file_path) -> str:
+    return FLOW_FILE_FORMATS.get(os.path.splitext(str(file_path))[1].lower(), "csv")
+
+def read_flow_file(file_path, final_features, engine=None, plan=None, keep_label=False):
+    
+    file_format = flow_format(file_path)
+    if file_format == "csv":
+        return read_flow_csv(file_path, final_features, engine=engine, plan=plan, keep_label=keep_label)
+    return read_flow_columnar(file_path, file_format, final_features, plan=plan, keep_label=keep_label)
+
+def columnar_header(source, file_format):
+    
+    if file_format == "parquet":
+        return tuple(pq.read_schema(source).names)
+    return tuple(_open_ipc(source).schema.names)
+
+def read_flow_columnar(source, file_format, final_features, plan=None, keep_label=False):
+    
+    # source is a path or a binary buffer; only the planned columns are read, nothing is text-parsed
+    if plan is None:
+        plan = resolve_schema(columnar_header(source, file_format), final_features, keep_label)
+        if hasattr(source, "seek"):
+            source.seek(0)
+    plan.validate()
+    
+    if file_format == "parquet":
+        table = pq.read_table(source, columns=list(plan.usecols))
+    else:
+        table = _open_ipc(source).read_all().select(list(plan.usecols))
+    data = table.to_pandas()
+    # identity columns keep their nulls, only the features and the label are cast
+    casts = {column: dtype for column, dtype in plan.dtypes.items() if dtype is not str}
+    return data.astype(casts), plan
+
+def _open_ipc(source):
+    
+    if isinstance(source, (str, os.PathLike)):
+        source = pa.memory_map(str(source))
+    try:
+        return pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        # not the random access file format, try the streaming one
+        source.seek(0)
+        return pa.ipc.open_stream(source)
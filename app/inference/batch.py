@@ -0,0 +1,106 @@
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import engine
+from .builder import MAIN_PIPELINE_PATH, ensure_main_pipeline
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from flow_reader import FLOW_FILE_FORMATS, read_flow_file
+import model_store
+
+
+SCORE_WORKERS = int(os.getenv("SCORE_WORKERS", str(os.cpu_count() or 1)))
+OUTPUT_SUFFIX = ".predictions"
+INPUT_SUFFIXES = tuple(FLOW_FILE_FORMATS) + (".csv.gz",)
+
+
+def _input_name(path) -> bool:
+
+    name = os.path.basename(path).lower()
+    return name.endswith(INPUT_SUFFIXES) and OUTPUT_SUFFIX not in name
+
+def expand_inputs(patterns) -> list:
+
+    # directories are searched recursively, globs are expanded, plain paths are kept as given
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                files.extend(sorted(os.path.join(root, name) for name in names if _input_name(name)))
+        elif glob.has_magic(pattern):
+            files.extend(sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)))
+        else:
+            files.append(pattern)
+    return list(dict.fromkeys(files))
+
+def output_path_for(file_path, output_format="parquet", output_dir=None) -> str:
+
+    name = os.path.basename(file_path)
+    for suffix in sorted(INPUT_SUFFIXES, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return os.path.join(output_dir or os.path.dirname(file_path), f"{name}{OUTPUT_SUFFIX}.{output_format}")
+
+def score_file(file_path, output_format="parquet", output_dir=None, evaluate=False) -> dict:
+
+    # runs in a worker, the pipeline is loaded on its first file and kept for the others
+    start = time.perf_counter()
+    main_pipeline = engine.get_pipeline()
+    data, plan = read_flow_file(file_path, main_pipeline.cleaning_pipeline.final_features, keep_label=evaluate)
+    features, kept_index = main_pipeline.clean(data)
+    predictions, proba = main_pipeline.predict_cleaned(features, return_proba=True, copy=False)
+
+    kept_rows = data.iloc[kept_index]
+    result = plan.flow_identity(kept_rows).reset_index(drop=True)
+    result.insert(0, "row", kept_index)
+    result["prediction"] = predictions
+    result["attack_probability"] = main_pipeline.attack_probability(proba)
+    output_path = output_path_for(file_path, output_format, output_dir)
+    if output_format == "csv":
+        result.to_csv(output_path, index=False)
+    else:
+        result.to_parquet(output_path, index=False)
+
+    return {
+        "file": file_path,
+        "output": output_path,
+        "rows": len(data),
+        "scored": len(predictions),
+        "seconds": time.perf_counter() - start,
+        "evaluation": engine.evaluate(data, predictions, kept_index) if evaluate else None
+    }
+
+def score_files(files, workers=SCORE_WORKERS, output_format="parquet", output_dir=None, evaluate=False):
+
+    # built once up front, otherwise every worker would queue on the build lock at start
+    version, pipeline_path = model_store.active_pipeline_path(MAIN_PIPELINE_PATH)
+    if version is None:
+        ensure_main_pipeline(pipeline_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    rows = 0
+    workers = max(1, min(workers, len(files)))
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # files are the unit of work, the largest go first so one big capture doesn't finish last
+        ordered = sorted(files, key=lambda path: os.path.getsize(path), reverse=True)
+        futures = [executor.submit(score_file, path, output_format, output_dir, evaluate) for path in ordered]
+        for future in as_completed(futures):
+            result = future.result()
+            rows += result["rows"]
+            elapsed = time.perf_counter() - start
+            print(f"[INFO] {result['file']}: {result['scored']} of {result['rows']} rows scored in {result['seconds']:.1f}s -> {result['output']} ({rows / elapsed:,.0f} rows/s overall)")
+            yield result
+
+    elapsed = time.perf_counter() - start
+    print(f"[INFO] Scored {len(files)} files, {rows} rows in {elapsed:.1f}s with {workers} workers, {rows / elapsed if elapsed else 0:,.0f} rows/s")
@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import joblib
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+# imported by their top-level names so the pickles keep loading wherever app/ is on the path
+from data_cleaning_pipeline import DataCleaningPipeline
+from main_pipeline import MainPipeline
+
+
+MODEL_PICKLE_NAME = 'rf_pipeline_without_smote.pkl'
+MODEL_PIPELINE_PATH = os.path.join(APP_DIR, MODEL_PICKLE_NAME)
+CLEANING_PIPELINE_PATH = os.path.join(APP_DIR, "cleaning_pipeline.pkl")
+MAIN_PIPELINE_PATH = os.path.join(APP_DIR, "main_pipeline.pkl")
+PIPELINE_BUILD_TIMEOUT = float(os.getenv("PIPELINE_BUILD_TIMEOUT", "600"))
+
+_build_lock = threading.Lock()
+
+
+def _try_lock(lock_file) -> bool:
+
+    try:
+        if os.name == "nt":
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+def _unlock(lock_file):
+
+    if os.name == "nt":
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+@contextmanager
+def build_lock(path=MAIN_PIPELINE_PATH, timeout: float = PIPELINE_BUILD_TIMEOUT):
+
+    # threads of this process queue on the mutex, other processes (uvicorn workers, CLIs) on the lock file;
+    # the OS drops the file lock if its holder dies, so a crashed build never wedges the others
+    with _build_lock:
+        with open(f"{path}.lock", "a+b") as lock_file:
+            deadline = time.monotonic() + timeout
+            while not _try_lock(lock_file):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out after {timeout:.0f}s waiting for another process to build {path}")
+                time.sleep(0.1)
+            try:
+                yield
+            finally:
+                _unlock(lock_file)
+
+def dump_atomic(obj, path):
+
+    # readers only ever see the previous pickle or the complete new one
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        joblib.dump(obj, tmp_path)
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def check_files_exist(model_path=MODEL_PIPELINE_PATH):
+
+    if not os.path.exists(model_path):
+        print(f"Error: The trained model is missing: {model_path}")
+        raise FileNotFoundError(f"Missing required files: {model_path}")
+    print("All required files present. Proceeding...")
+
+def build_cleaning_pipeline(path=CLEANING_PIPELINE_PATH) -> DataCleaningPipeline:
+
+    cleaning_pipeline = DataCleaningPipeline()
+    dump_atomic(cleaning_pipeline, path)
+    print("cleaning pipeline pickled successfully!")
+    return cleaning_pipeline
+
+def build_main_pipeline(path=MAIN_PIPELINE_PATH, cleaning_pipeline=None, model_path=MODEL_PIPELINE_PATH) -> MainPipeline:
+
+    if cleaning_pipeline is None:
+        cleaning_pipeline = joblib.load(CLEANING_PIPELINE_PATH)
+    model_pipeline = joblib.load(model_path)
+    main_pipeline = MainPipeline(cleaning_pipeline, model_pipeline)
+    dump_atomic(main_pipeline, path)
+    print("Main pipeline pickled successfully!")
+    return main_pipeline
+
+def ensure_main_pipeline(path=MAIN_PIPELINE_PATH) -> str:
+
+    if os.path.exists(path):
+        return path
+    # concurrent callers, in this process or others, wait for the first one instead of building the pickles again
+    with build_lock(path):
+        if os.path.exists(path):
+            print(f"Pipeline was built by another worker: {path}")
+            return path
+        print("Pipeline not found, creating it...")
+        check_files_exist()
+        build_main_pipeline(path, build_cleaning_pipeline())
+    return path
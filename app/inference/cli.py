@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from .batch import SCORE_WORKERS, expand_inputs, score_files
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Score flow files with the main pipeline")
+    parser.add_argument("inputs", nargs="+", help="CSV (also .csv.gz), Parquet or Arrow files, globs or directories")
+    parser.add_argument("--workers", type=int, default=SCORE_WORKERS, help="Scoring processes")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet", help="Format of the prediction files")
+    parser.add_argument("--output-dir", help="Write predictions here instead of next to each input")
+    parser.add_argument("--evaluate", action="store_true", help="Compare predictions with the files' Label column")
+    args = parser.parse_args(argv)
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("Error: No flow files matched")
+        sys.exit(1)
+    for file_path in files:
+        if not os.path.exists(file_path):
+            print(f"Error: File {file_path} not found")
+            sys.exit(1)
+
+    for result in score_files(files, args.workers, args.format, args.output_dir, args.evaluate):
+        if not args.evaluate:
+            continue
+        if result["evaluation"] is None:
+            print(f"{result['file']} has no label column, nothing to evaluate")
+            continue
+        print_report(result["file"], result["evaluation"])
+
+
+def print_report(file_path, report):
+
+    accuracy = "n/a" if report["accuracy"] is None else f"{report['accuracy']:.4f}"
+    print(f"{file_path}: {report['labelled_rows']} of {report['rows']} scored rows labelled, accuracy {accuracy}")
+    matrix = pd.DataFrame(report["confusion_matrix"], index=report["classes"], columns=report["classes"])
+    matrix.index.name, matrix.columns.name = "true", "predicted"
+    print(matrix.to_string())
+    print(pd.DataFrame.from_dict(report["per_class"], orient="index").to_string(float_format="{:.4f}".format))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import os
+import sys
+import threading
+import time
+
+import joblib
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
+
+from main_pipeline import MainPipeline
+from prediction_cache import PredictionCache, PREDICTION_CACHE_SIZE
+from schema import resolve_schema
+from flow_reader import read_flow_file
+from shadow_scoring import ShadowScorer, SHADOW_SAMPLE_RATE
+import model_store
+from drift import FeatureSketch, current_baseline
+from evaluation import evaluation_report, true_labels
+from .builder import MAIN_PIPELINE_PATH, ensure_main_pipeline
+
+
+# one loaded pipeline per process, shared by the API, the CLI and the scripts,
+# reloaded only when the served pickle changes
+_main_pipeline = None
+_pipeline_key = None
+_pipeline_version = None
+_pipeline_lock = threading.Lock()
+_shadow = None
+_rejected_shadow = None
+_shadow_lock = threading.Lock()
+
+
+def _load_pipeline(pipeline_path):
+
+    print(f"Loading pipeline from {pipeline_path}...")
+    main_pipeline = joblib.load(pipeline_path)
+    print(f"Pipeline loaded, type: {type(main_pipeline)}")
+    
+    
+    if not isinstance(main_pipeline, MainPipeline):
+        raise TypeError("Loaded pipeline is not of type MainPipeline")
+    
+    if not hasattr(main_pipeline, 'transform_and_predict'):
+        raise AttributeError("Loaded pipeline doesn't have transform_and_predict method")
+    
+    return main_pipeline
+
+
+def get_pipeline():
+
+    global _main_pipeline, _pipeline_key, _pipeline_version
+    version, pipeline_path = model_store.active_pipeline_path(MAIN_PIPELINE_PATH)
+    if version is None:
+        ensure_main_pipeline(pipeline_path)
+    
+    if not os.path.exists(pipeline_path):
+        raise FileNotFoundError(f"Failed to find pipeline {pipeline_path}")
+    
+    key = (pipeline_path, os.path.getmtime(pipeline_path))
+    main_pipeline = _main_pipeline
+    if main_pipeline is not None and key == _pipeline_key:
+        return main_pipeline
+    
+    # while one thread loads a new version the others keep serving the old one
+    if main_pipeline is not None:
+        if not _pipeline_lock.acquire(blocking=False):
+            return main_pipeline
+    else:
+        _pipeline_lock.acquire()
+    try:
+        if _main_pipeline is not None and key == _pipeline_key:
+            return _main_pipeline
+        main_pipeline = _load_pipeline(pipeline_path)
+        
+        if PREDICTION_CACHE_SIZE > 0:
+            main_pipeline.prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE)
+        
+        _main_pipeline = main_pipeline
+        _pipeline_key = key
+        _pipeline_version = version
+        print(f"Serving model version {version or 'main_pipeline.pkl'}")
+        return main_pipeline
+    finally:
+        _pipeline_lock.release()
+
+
+def get_shadow(main_pipeline):
+
+    global _shadow, _rejected_shadow
+    version = model_store.shadow_version()
+    if version is None or version == _pipeline_version:
+        if _shadow is not None:
+            with _shadow_lock:
+                if _shadow is not None:
+                    _shadow.stop()
+                    _shadow = None
+        return None
+    
+    shadow = _shadow
+    if shadow is not None and shadow.version == version:
+        return shadow
+    if version == _rejected_shadow:
+        return None
+    
+    if not _shadow_lock.acquire(blocking=False):
+        return None
+    try:
+        if _shadow is not None:
+            _shadow.stop()
+            _shadow = None
+        shadow_pipeline = _load_pipeline(model_store.pipeline_path(version))
+        # the shadow scores the primary's cleaned rows, so both must expect the same features
+        if list(shadow_pipeline.cleaning_pipeline.final_features) != list(main_pipeline.cleaning_pipeline.final_features):
+            print(f"[ERROR] Shadow model {version} expects different features, not shadowing it")
+            _rejected_shadow = version
+            return None
+        _shadow = ShadowScorer(shadow_pipeline, version)
+        print(f"Shadow scoring {SHADOW_SAMPLE_RATE:.0%} of traffic with model version {version}")
+        return _shadow
+    except Exception as e:
+        print(f"[ERROR] Failed to load shadow model {version}: {str(e)}")
+        _rejected_shadow = version
+        return None
+    finally:
+        _shadow_lock.release()
+
+
+def serving_version():
+
+    return _pipeline_version or os.path.basename(MAIN_PIPELINE_PATH)
+
+
+def model_versions():
+
+    return {
+        "serving": _pipeline_version,
+        "current": model_store.current_version(),
+        "shadow": model_store.shadow_version(),
+        "versions": [model_store.version_info(version) for version in model_store.list_versions()]
+    }
+
+
+def shadow_stats():
+
+    shadow = _shadow
+    if shadow is None:
+        return {"enabled": False}
+    return {"enabled": True, "serving": _pipeline_version, **shadow.stats()}
+
+
+def cache_stats():
+
+    main_pipeline = _main_pipeline
+    if main_pipeline is None or main_pipeline.prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **main_pipeline.prediction_cache.stats()}
+
+
+def column_plan(columns, keep_label=False):
+
+    main_pipeline = get_pipeline()
+    return resolve_schema(columns, main_pipeline.cleaning_pipeline.final_features, keep_label)
+
+
+def drift_sketch(main_pipeline, features):
+
+    baseline = current_baseline()
+    if baseline is None:
+        return None
+    if baseline.features != list(main_pipeline.cleaning_pipeline.final_features):
+        print("[WARNING] Drift baseline was built for other features, recreate it with create_drift_baseline.py")
+        return None
+    return baseline.baseline_id, FeatureSketch.from_features(features, baseline)
+
+
+def _predict_chunks(main_pipeline, features, chunk_rows=None, on_progress=None):
+    
+    # cleaning already saw every row, only the model runs chunk by chunk so progress can be reported
+    if not chunk_rows or len(features) <= chunk_rows:
+        predictions, proba = main_pipeline.predict_cleaned(features, return_proba=True, copy=False)
+        if on_progress is not None:
+            on_progress("scored", len(predictions))
+        return predictions, proba
+    
+    predictions, proba = [], []
+    for begin in range(0, len(features), chunk_rows):
+        chunk_predictions, chunk_proba = main_pipeline.predict_cleaned(features[begin:begin + chunk_rows], return_proba=True, copy=False)
+        predictions.append(chunk_predictions)
+        proba.append(chunk_proba)
+        if on_progress is not None:
+            on_progress("scored", begin + len(chunk_predictions))
+    return np.concatenate(predictions), np.concatenate(proba)
+
+
+def process_frame(data, return_index=False, return_proba=False, on_cleaned=None, chunk_rows=None, on_progress=None):
+    
+    main_pipeline = get_pipeline()
+    shadow = get_shadow(main_pipeline)
+    features, kept_index = main_pipeline.clean(data)
+    if on_cleaned is not None:
+        on_cleaned(main_pipeline, features)
+    if on_progress is not None:
+        on_progress("cleaned", len(features))
+    # the shadow's sample is copied out before the primary model scales the matrix in place
+    sample = shadow.sample(len(features)) if shadow is not None else None
+    shadow_features = features[sample] if sample is not None else None
+    
+    start = time.perf_counter()
+    predictions, proba = _predict_chunks(main_pipeline, features, chunk_rows, on_progress)
+    if shadow is not None:
+        shadow_predictions = predictions[sample] if sample is not None else None
+        shadow.submit(shadow_features, shadow_predictions, time.perf_counter() - start, len(features))
+    print(f"Generated {len(predictions)} predictions")
+    
+    if return_index and return_proba:
+        return predictions, proba, kept_index
+    if return_index:
+        return predictions, kept_index
+    if return_proba:
+        return predictions, proba
+    return predictions
+
+
+def process_file(file_path, return_index=False, return_proba=False):
+    
+    print(f"Processing file: {file_path}")
+    main_pipeline = get_pipeline()
+    data, _ = read_flow_file(file_path, main_pipeline.cleaning_pipeline.final_features)
+    print(f"Flows loaded with shape: {data.shape}")
+    return process_frame(data, return_index=return_index, return_proba=return_proba)
+
+
+def evaluate(data, predictions, kept_index):
+
+    # scored rows against the file's own ground truth, None when it has no label column
+    main_pipeline = get_pipeline()
+    plan = column_plan(data.columns)
+    if plan.label is None or plan.label not in data.columns:
+        return None
+    y_true = true_labels(data[plan.label].iloc[kept_index])
+    return {"model_version": serving_version(), **evaluation_report(y_true, predictions, main_pipeline.classes)}
+
+
+def evaluate_file(file_path):
+
+    print(f"Evaluating file: {file_path}")
+    main_pipeline = get_pipeline()
+    data, _ = read_flow_file(file_path, main_pipeline.cleaning_pipeline.final_features, keep_label=True)
+    predictions, kept_index = process_frame(data, return_index=True)
+    return predictions, evaluate(data, predictions, kept_index)
@@ -0,0 +1,47 @@
+import pandas as pd
+
+
+BENIGN_LABEL = "BENIGN"
+
+# same grouping as Dataset1/Data_cleaning.ipynb
+ATTACK_TYPE_MAP = {
+    'BENIGN': "BENIGN",
+
+    'DoS Hulk': "DoS",
+    'DoS GoldenEye': "DoS",
+    'DoS slowloris': "DoS",
+    'DoS Slowhttptest': "DoS",
+
+    'DDoS': "DDoS",
+
+    'PortScan': "PortScan",
+
+    'FTP-Patator': "Brute Force",
+    'SSH-Patator': "Brute Force",
+
+    'Web Attack Brute Force': "Web Attack",
+    'Web Attack XSS': "Web Attack",
+    'Web Attack Sql Injection': "Web Attack",
+
+    'Bot': "Bot",
+
+    'Infiltration': "Exploits",
+    'Heartbleed': "Exploits"
+}
+
+
+def _normalize_label(label) -> str:
+    # the CICIDS exports write the web attack dash in cp1252, which decodes differently per reader
+    label = str(label).strip()
+    if label.startswith("Web Attack"):
+        label = ("Web Attack " + label[len("Web Attack"):].strip(" -\u2013\ufffd\x96")).strip()
+    return label
+
+def map_attack_types(labels: pd.Series) -> pd.Series:
+
+    labels = pd.Series(labels, copy=False)
+    mapping = {}
+    for label in labels.dropna().unique():
+        normalized = _normalize_label(label)
+        mapping[label] = ATTACK_TYPE_MAP.get(normalized, normalized)
+    return labels.map(mapping)
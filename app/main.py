@@ -1,13 +1,18 @@
 from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, RedirectResponse
 from app.api.endpoints import router as api_router
-from app.core.database import Base, engine, get_db, User, Workspace
+from app.core.database import Base, engine, get_async_db, User, Workspace
 from app.core.auth import get_user_by_api_key
-from sqlalchemy.orm import Session
+from app.core.retention import maintenance_loop
+from app.core.jobs import EMBEDDED_SCORING_WORKERS, start_embedded_workers, stop_embedded_workers
+from app.core.uploads import publish_detections
+from app.core.assets import CachedStaticFiles, CompressionMiddleware, STATIC_DIR, TEMPLATE_AUTO_RELOAD, static_url
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pathlib import Path
+import asyncio
 
 
 Base.metadata.create_all(bind=engine)
@@ -27,19 +32,42 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# gzip (or Brotli) for pages, API JSON and static files, never for the live event streams
+app.add_middleware(CompressionMiddleware)
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
 
 
 templates = Jinja2Templates(directory="app/templates")
+# compiled templates are kept in memory, without checking the files for changes on every render
+templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+templates.env.globals["static_url"] = static_url
 
 
 app.include_router(api_router, prefix="/api")
 
 
+@app.on_event("startup")
+async def start_maintenance():
+    
+    # compile every template once, before the first page is served
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+    app.state.maintenance_task = asyncio.create_task(maintenance_loop())
+    # embedded workers publish their detections to this server's live feeds
+    app.state.scoring_workers = start_embedded_workers(EMBEDDED_SCORING_WORKERS, on_stored=publish_detections)
+
+@app.on_event("shutdown")
+async def stop_maintenance():
+    
+    app.state.maintenance_task.cancel()
+    stop_embedded_workers(app.state.scoring_workers)
+
+
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     
     api_key = request.cookies.get("api_key")
@@ -74,13 +102,16 @@ async def register_page(request: Request, current_user: User = Depends(get_curre
 async def workspaces_page(
     request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     
     if not current_user:
         return RedirectResponse(url="/login")
 
-    workspaces = db.query(Workspace).filter(Workspace.user_id == current_user.id).all()
+    workspaces = (await db.execute(select(Workspace).where(
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().all()
     return templates.TemplateResponse(
         "workspaces.html",
         {
@@ -94,16 +125,17 @@ async def dashboard_page(
     request: Request,
     workspace_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     
     if not current_user:
         return RedirectResponse(url="/login")
 
-    workspace = db.query(Workspace).filter(
+    workspace = (await db.execute(select(Workspace).where(
         Workspace.id == workspace_id,
-        Workspace.user_id == current_user.id
-    ).first()
+        Workspace.user_id == current_user.id,
+        Workspace.deleted_at.is_(None)
+    ))).scalars().first()
 
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
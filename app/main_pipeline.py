@@ -1,11 +1,162 @@
+import inspect
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+
 class MainPipeline:
-    def __init__(self, cleaning_pipeline, model_pipeline):
+    benign_label = "BENIGN"
+    # optional first stage, see enable_cascade
+    cascade_model = None
+    cascade_threshold = 0.5
+    # attached by app/inference/engine.py after loading, never pickled
+    prediction_cache = None
+
+    def __init__(self, cleaning_pipeline, model_pipeline, cascade_model=None, cascade_threshold=0.5):
         self.cleaning_pipeline = cleaning_pipeline
         self.model_pipeline = model_pipeline
+        self.cascade_model = cascade_model
+        self.cascade_threshold = cascade_threshold
+
+    def __getstate__(self):
+        
+        state = self.__dict__.copy()
+        state.pop("prediction_cache", None)
+        return state
+
+    @property
+    def classes(self):
+        
+        classes = getattr(self.model_pipeline, "classes_", None)
+        return None if classes is None else np.asarray(classes)
+
+    def enable_cascade(self, cascade_model, threshold):
+        
+        self.cascade_model = cascade_model
+        self.cascade_threshold = threshold
+
+    def disable_cascade(self):
+        
+        self.cascade_model = None
+
+    def transform_and_predict(self, data, return_index=False, return_proba=False):
+        
+        features, kept_index = self.clean(data)
+        # the cleaned matrix is private to this call, so the model may transform it in place
+        result = self.predict_cleaned(features, return_proba=return_proba, copy=False)
+        if not return_index:
+            return result
+        if return_proba:
+            return result[0], result[1], kept_index
+        return result, kept_index
+
+    def clean(self, data):
+        
+        if hasattr(self.cleaning_pipeline, "transform_array"):
+            return self.cleaning_pipeline.transform_array(data)
+        cleaned_data = self.cleaning_pipeline.transform_with_index(data)
+        return np.ascontiguousarray(cleaned_data, dtype=np.float32), cleaned_data.index.to_numpy()
 
-    def transform_and_predict(self, data):
+    def predict_cleaned(self, cleaned_data, return_proba=False, copy=True):
         
-        cleaned_data = self.cleaning_pipeline.transform(data)
+        if len(cleaned_data) == 0:
+            width = 0 if self.classes is None else len(self.classes)
+            predictions, proba = np.empty(0, dtype=object), np.zeros((0, width), dtype=np.float32)
+        elif self.cascade_model is None:
+            # labels are the argmax of the class probabilities, so both come from the same pass over the trees
+            proba = self._predict_full(cleaned_data, copy=copy)
+            classes = self.classes if self.classes is not None else np.arange(proba.shape[1])
+            predictions = classes[proba.argmax(axis=1)]
+        else:
+            predictions, proba = self._predict_cascade(cleaned_data)
         
-        predictions = self.model_pipeline.predict(cleaned_data)
+        if return_proba:
+            return predictions, proba
         return predictions
+
+    def top_k(self, proba, k=3):
+        
+        k = min(k, proba.shape[1])
+        order = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+        classes = self.classes if self.classes is not None else np.arange(proba.shape[1])
+        return classes[order], np.take_along_axis(proba, order, axis=1)
+
+    def attack_probability(self, proba):
+        
+        # NaN when the model has no benign class, e.g. integer labels: there is no probability to report
+        classes = self.classes
+        if classes is None or self.benign_label not in classes:
+            return np.full(len(proba), np.nan, dtype=np.float32)
+        return 1.0 - proba[:, list(classes).index(self.benign_label)]
+
+    def _predict_cascade(self, cleaned_data):
+        
+        # the cheap benign/attack model screens every row, only suspicious ones reach the full classifier
+        classes = self.classes
+        if classes is None or self.benign_label not in classes:
+            raise ValueError(f"The cascade needs a model with a {self.benign_label} class for the rows it screens out")
+        attack_score = self._cascade_score(cleaned_data)
+        suspicious = attack_score >= self.cascade_threshold
+        
+        predictions = np.full(len(cleaned_data), self.benign_label, dtype=object)
+        proba = np.zeros((len(cleaned_data), len(classes)), dtype=np.float32)
+        # screened rows only carry the cascade's benign score
+        proba[~suspicious, list(classes).index(self.benign_label)] = 1.0 - attack_score[~suspicious]
+        if suspicious.any():
+            proba[suspicious] = self._predict_full(cleaned_data[suspicious], copy=False)
+            predictions[suspicious] = classes[proba[suspicious].argmax(axis=1)]
+        print(f"Cascade forwarded {int(suspicious.sum())} of {len(cleaned_data)} rows to the full model")
+        return predictions, proba
+
+    def _predict_full(self, cleaned_data, copy=True):
+        
+        if self.prediction_cache is None:
+            return self._model_proba(cleaned_data, copy=copy)
+        # the cache hands over a fresh subset of rows
+        return self.prediction_cache.predict(cleaned_data, lambda rows: self._model_proba(rows, copy=False))
+
+    def _model_proba(self, cleaned_data, copy=True):
+        
+        model = self.model_pipeline
+        steps = getattr(model, "steps", None)
+        with _bare_matrix():
+            if not copy and steps and hasattr(steps[-1][1], "predict_proba"):
+                # run the preprocessing steps in place instead of allocating another matrix per step
+                for _, step in steps[:-1]:
+                    cleaned_data = _transform_in_place(step, cleaned_data)
+                model = steps[-1][1]
+            
+            if hasattr(model, "predict_proba"):
+                return np.asarray(model.predict_proba(cleaned_data), dtype=np.float32)
+            
+            # models without probabilities get a one-hot row for their label
+            if self.classes is None:
+                raise ValueError("The model has neither predict_proba nor classes_, its labels cannot be scored")
+            labels = np.asarray(model.predict(cleaned_data))
+        return (labels[:, None] == self.classes[None, :]).astype(np.float32)
+
+    def _cascade_score(self, cleaned_data):
+        
+        classes = list(self.cascade_model.classes_)
+        if 1 not in classes:
+            return np.zeros(len(cleaned_data))
+        with _bare_matrix():
+            return self.cascade_model.predict_proba(cleaned_data)[:, classes.index(1)]
+
+
+@contextmanager
+def _bare_matrix():
+    
+    # the models were fitted on DataFrames and are fed the cleaned float32 matrix, whose columns
+    # clean() puts in the fitted order; the warning is only silenced for these calls
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        yield
+
+def _transform_in_place(step, data):
+    
+    if step is None or step == "passthrough":
+        return data
+    if "copy" in inspect.signature(step.transform).parameters:
+        return step.transform(data, copy=False)
+    return step.transform(data)
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from datetime import datetime, timezone
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", os.path.join(APP_DIR, "models"))
+PIPELINE_FILENAME = "main_pipeline.pkl"
+CURRENT_POINTER = "CURRENT"
+SHADOW_POINTER = "SHADOW"
+
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def _check_version(version) -> str:
+
+    version = str(version)
+    if not VERSION_PATTERN.match(version):
+        raise ValueError(f"Invalid model version '{version}'")
+    return version
+
+def version_dir(version) -> str:
+    return os.path.join(MODEL_STORE_DIR, _check_version(version))
+
+def pipeline_path(version) -> str:
+    return os.path.join(version_dir(version), PIPELINE_FILENAME)
+
+def list_versions() -> list:
+
+    if not os.path.isdir(MODEL_STORE_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(MODEL_STORE_DIR)
+        if VERSION_PATTERN.match(name) and os.path.exists(os.path.join(MODEL_STORE_DIR, name, PIPELINE_FILENAME))
+    )
+
+def version_info(version) -> dict:
+
+    path = os.path.join(version_dir(version), "metadata.json")
+    if not os.path.exists(path):
+        return {"version": version}
+    with open(path) as f:
+        return {"version": version, **json.load(f)}
+
+def read_pointer(name):
+
+    path = os.path.join(MODEL_STORE_DIR, name)
+    try:
+        with open(path) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+def write_pointer(name, version):
+
+    os.makedirs(MODEL_STORE_DIR, exist_ok=True)
+    path = os.path.join(MODEL_STORE_DIR, name)
+    if version is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    # readers either see the old version or the new one, never a half written pointer
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(f"{version}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def current_version():
+    return read_pointer(CURRENT_POINTER)
+
+def shadow_version():
+    return read_pointer(SHADOW_POINTER)
+
+def active_pipeline_path(default_path):
+
+    # falls back to the single pickle the create_* scripts write until a version is promoted
+    version = current_version()
+    if version is None:
+        return None, default_path
+    return version, pipeline_path(version)
+
+def _sha256(path) -> str:
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def publish(source_path, version=None) -> str:
+
+    version = _check_version(version or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"))
+    target_dir = version_dir(version)
+    if os.path.exists(target_dir):
+        raise ValueError(f"Model version '{version}' already exists")
+
+    # the version directory only appears once its pickle is complete
+    os.makedirs(MODEL_STORE_DIR, exist_ok=True)
+    staging_dir = os.path.join(MODEL_STORE_DIR, f".{version}.tmp")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    shutil.copyfile(source_path, os.path.join(staging_dir, PIPELINE_FILENAME))
+    metadata = {
+        "source": os.path.abspath(source_path),
+        "sha256": _sha256(source_path),
+        "published_at": datetime.now(timezone.utc).isoformat()
+    }
+    with open(os.path.join(staging_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+    os.replace(staging_dir, target_dir)
+    print(f"[INFO] Published {source_path} as model version {version}")
+    return version
+
+def promote(version):
+
+    if not os.path.exists(pipeline_path(version)):
+        raise ValueError(f"Model version '{version}' does not exist")
+    previous = current_version()
+    write_pointer(CURRENT_POINTER, version)
+    if shadow_version() == version:
+        write_pointer(SHADOW_POINTER, None)
+    print(f"[INFO] Promoted model version {version} (was {previous})")
+
+def set_shadow(version):
+
+    if version is not None and not os.path.exists(pipeline_path(version)):
+        raise ValueError(f"Model version '{version}' does not exist")
+    write_pointer(SHADOW_POINTER, version)
+    print(f"[INFO] Shadow model set to {version}")
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Manage versioned main pipelines")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish_parser = commands.add_parser("publish", help="Copy a pickled MainPipeline into the store")
+    publish_parser.add_argument("path")
+    publish_parser.add_argument("--version", help="Version name (default: UTC timestamp)")
+    publish_parser.add_argument("--promote", action="store_true", help="Serve it right away")
+    publish_parser.add_argument("--shadow", action="store_true", help="Score a sample of live traffic with it")
+    promote_parser = commands.add_parser("promote", help="Serve a stored version")
+    promote_parser.add_argument("version")
+    shadow_parser = commands.add_parser("shadow", help="Shadow a stored version, or 'off'")
+    shadow_parser.add_argument("version")
+    commands.add_parser("list", help="List stored versions")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "publish":
+            version = publish(args.path, args.version)
+            if args.promote:
+                promote(version)
+            elif args.shadow:
+                set_shadow(version)
+        elif args.command == "promote":
+            promote(args.version)
+        elif args.command == "shadow":
+            set_shadow(None if args.version == "off" else args.version)
+        else:
+            current, shadow = current_version(), shadow_version()
+            for version in list_versions():
+                marker = " (current)" if version == current else " (shadow)" if version == shadow else ""
+                print(f"{version}{marker}")
+    except ValueError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
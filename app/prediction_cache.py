@@ -0,0 +1,79 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "200000"))
+
+
+class PredictionCache:
+
+    def __init__(self, max_entries: int = PREDICTION_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def row_keys(data) -> list:
+        # keyed on the exact float32 feature bytes the model sees, so only identical flows share a prediction
+        values = np.ascontiguousarray(data, dtype=np.float32)
+        return [row.tobytes() for row in values]
+
+    def predict(self, data, predict_fn) -> np.ndarray:
+        
+        keys = self.row_keys(data)
+        results = [None] * len(keys)
+        pending = {}
+        
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._entries.get(key)
+                if row is None:
+                    pending.setdefault(key, []).append(i)
+                    continue
+                self._entries.move_to_end(key)
+                results[i] = row
+            missed = sum(len(positions) for positions in pending.values())
+            self.hits += len(keys) - missed
+            self.misses += missed
+        
+        if pending:
+            # every distinct unseen flow is scored once, repeats inside the batch share the result
+            first_rows = [positions[0] for positions in pending.values()]
+            scored = predict_fn(data.iloc[first_rows] if hasattr(data, "iloc") else data[first_rows])
+            
+            with self._lock:
+                for (key, positions), row in zip(pending.items(), scored):
+                    # copy so cached rows don't keep the whole scored batch alive
+                    row = row.copy()
+                    for i in positions:
+                        results[i] = row
+                    self._entries[key] = row
+                    self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return np.stack(results)
+
+    def clear(self):
+        
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,161 @@
+import csv
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+SCHEMA_CACHE_SIZE = int(os.getenv("SCHEMA_CACHE_SIZE", "64"))
+
+# spellings seen across CICFlowMeter versions and hand-made exports, compared after normalize_column
+KEY_COLUMN_ALIASES = {
+    "flow_id": ("flow id",),
+    "source_ip": ("source ip", "src ip"),
+    "source_port": ("source port", "src port"),
+    "destination_ip": ("destination ip", "dst ip"),
+    "destination_port": ("destination port", "dst port"),
+    "protocol": ("protocol",),
+    "timestamp": ("timestamp",),
+    "label": ("label",),
+}
+
+
+class SchemaError(ValueError):
+
+    def __init__(self, missing):
+        self.missing = list(missing)
+        super().__init__(f"CSV is missing required feature columns: {', '.join(self.missing)}")
+
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    header: Tuple[str, ...]
+    rename: Dict[str, str]
+    feature_columns: Tuple[str, ...]
+    missing: Tuple[str, ...]
+    usecols: Tuple[str, ...]
+    dtypes: Dict[str, object]
+    key_columns: Dict[str, Optional[str]]
+
+    @property
+    def source_ip(self):
+        return self.key_columns["source_ip"]
+
+    @property
+    def destination_ip(self):
+        return self.key_columns["destination_ip"]
+
+    @property
+    def destination_port(self):
+        return self.key_columns["destination_port"]
+
+    @property
+    def protocol(self):
+        return self.key_columns["protocol"]
+
+    @property
+    def label(self):
+        return self.key_columns["label"]
+
+    @property
+    def reads_label(self) -> bool:
+        return self.label is not None and self.label in self.dtypes
+
+    def validate(self):
+        
+        if self.missing:
+            raise SchemaError(self.missing)
+        return self
+
+    def flow_identity(self, df: pd.DataFrame) -> pd.DataFrame:
+        
+        # one vectorised pass instead of probing every row for each spelling
+        source_ip = _text_column(df, self.source_ip, "N/A")
+        port = _text_column(df, self.destination_port, "unknown")
+        destination_ip = _text_column(df, self.destination_ip, None)
+        destination_ip = destination_ip.where(destination_ip.notna(), "Port: " + port)
+        protocol = _text_column(df, self.protocol, "TCP/IP")
+        return pd.DataFrame({
+            "source_ip": source_ip,
+            "destination_ip": destination_ip,
+            "protocol": protocol,
+        }, index=df.index)
+
+
+def normalize_column(column) -> str:
+    return " ".join(str(column).strip().replace("_", " ").lower().split())
+
+def _text_column(df, column, default) -> pd.Series:
+    
+    if column is None or column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    values = df[column]
+    if pd.api.types.is_float_dtype(values) and np.all(np.mod(values.dropna(), 1) == 0):
+        # ports and protocol numbers parsed as floats would otherwise print as 80.0
+        values = values.astype("Int64")
+    text = values.astype(str).str.strip()
+    present = values.notna() & (text != "")
+    return text.where(present, default)
+
+def header_from_text(csv_text: str) -> Tuple[str, ...]:
+    
+    # Excel and Windows exports start with a byte order mark, pandas drops it when reading the rows
+    end = csv_text.find("\n")
+    first_line = (csv_text if end < 0 else csv_text[:end]).lstrip("\ufeff").rstrip("\r")
+    return tuple(next(csv.reader([first_line]), []))
+
+def read_header(file_path) -> Tuple[str, ...]:
+    return tuple(pd.read_csv(file_path, nrows=0).columns)
+
+def resolve_schema(columns, final_features, keep_label=False) -> ColumnPlan:
+    return _compile_plan(tuple(columns), tuple(final_features), bool(keep_label))
+
+@lru_cache(maxsize=SCHEMA_CACHE_SIZE)
+def _compile_plan(header, final_features, keep_label=False) -> ColumnPlan:
+    
+    rename = {column: column.strip() for column in header if column != column.strip()}
+    by_name = {}
+    for column in header:
+        by_name.setdefault(column.strip(), column)
+    
+    feature_columns = tuple(by_name[feature] for feature in final_features if feature in by_name)
+    missing = tuple(feature for feature in final_features if feature not in by_name)
+    
+    normalized = {}
+    for column in header:
+        normalized.setdefault(normalize_column(column), column)
+    key_columns = {}
+    for key, aliases in KEY_COLUMN_ALIASES.items():
+        key_columns[key] = next((normalized[alias] for alias in aliases if alias in normalized), None)
+    
+    # float32 is what the tree models compute in, and halves the parsed frame
+    dtypes = {column: np.float32 for column in feature_columns}
+    for key, column in key_columns.items():
+        if column is None or column in dtypes:
+            continue
+        if key == "label":
+            # ground truth is only parsed for evaluation, as a categorical a handful of codes wide
+            if keep_label:
+                dtypes[column] = "category"
+            continue
+        dtypes[column] = str
+    
+    # feature columns plus the columns that identify a flow, so dedup and logging keep working;
+    # the label is still found in key_columns even when it is not read
+    usecols = tuple(column for column in header if column in dtypes)
+    
+    return ColumnPlan(
+        header=header,
+        rename=rename,
+        feature_columns=feature_columns,
+        missing=missing,
+        usecols=usecols,
+        dtypes=dtypes,
+        key_columns=key_columns,
+    )
+
+def plan_cache_info():
+    return _compile_plan.cache_info()
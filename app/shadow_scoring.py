@@ -0,0 +1,107 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "64"))
+
+
+class ShadowScorer:
+
+    def __init__(self, pipeline, version, sample_rate: float = SHADOW_SAMPLE_RATE, queue_size: int = SHADOW_QUEUE_SIZE):
+        self.pipeline = pipeline
+        self.version = version
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+        self.batches = 0
+        self.rows = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.disagreements = Counter()
+        self.primary_seconds = 0.0
+        self.primary_rows = 0
+        self.shadow_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"shadow-{version}", daemon=True)
+        self._thread.start()
+
+    def sample(self, n_rows):
+
+        if n_rows == 0 or self.sample_rate <= 0:
+            return None
+        with self._lock:
+            picked = np.flatnonzero(self._rng.random(n_rows) < self.sample_rate)
+        return picked if len(picked) else None
+
+    def submit(self, features, primary_predictions, primary_seconds, primary_rows):
+
+        with self._lock:
+            self.primary_seconds += primary_seconds
+            self.primary_rows += primary_rows
+        if features is None:
+            return
+        # never wait on the shadow model from the request path, a full queue just skips the sample
+        try:
+            self._queue.put_nowait((features, np.asarray(primary_predictions)))
+        except queue.Full:
+            with self._lock:
+                self.dropped += len(features)
+
+    def stop(self):
+
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+
+        while not self._stopped.is_set():
+            try:
+                features, primary_predictions = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                start = time.perf_counter()
+                shadow_predictions = np.asarray(self.pipeline.predict_cleaned(features, copy=False))
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                print(f"[ERROR] Shadow model {self.version} failed: {str(e)}")
+                with self._lock:
+                    self.errors += 1
+                continue
+
+            disagree = primary_predictions.astype(str) != shadow_predictions.astype(str)
+            pairs = Counter(zip(primary_predictions[disagree].astype(str).tolist(), shadow_predictions[disagree].astype(str).tolist()))
+            with self._lock:
+                self.batches += 1
+                self.rows += len(features)
+                self.agreed += int(len(features) - disagree.sum())
+                self.shadow_seconds += elapsed
+                self.disagreements.update(pairs)
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            return {
+                "version": self.version,
+                "sample_rate": self.sample_rate,
+                "batches": self.batches,
+                "rows": self.rows,
+                "agreement": self.agreed / self.rows if self.rows else None,
+                "disagreements": [
+                    {"primary": primary, "shadow": shadow, "rows": rows}
+                    for (primary, shadow), rows in self.disagreements.most_common(20)
+                ],
+                "primary_ms_per_1k_rows": 1e6 * self.primary_seconds / self.primary_rows if self.primary_rows else None,
+                "shadow_ms_per_1k_rows": 1e6 * self.shadow_seconds / self.rows if self.rows else None,
+                "queued": self._queue.qsize(),
+                "dropped_rows": self.dropped,
+                "errors": self.errors
+            }
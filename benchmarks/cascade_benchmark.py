@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+from labels import BENIGN_LABEL, map_attack_types
+from cascade import fit_cascade, choose_threshold, CASCADE_TARGET_RECALL
+
+
+def rows_per_second(main_pipeline, X, repeats):
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictions = main_pipeline.predict_cleaned(X)
+        best = min(best, time.perf_counter() - start)
+    return predictions, len(X) / best
+
+def report(name, y_true, predictions, rate):
+
+    y_true = np.asarray(y_true)
+    predictions = np.asarray(predictions)
+    attacks = y_true != BENIGN_LABEL
+    accuracy = (predictions == y_true).mean()
+    attack_recall = (predictions[attacks] != BENIGN_LABEL).mean() if attacks.any() else float("nan")
+    print(f"{name:>10}: accuracy {accuracy:.4%}  attack recall {attack_recall:.4%}  {rate:,.0f} rows/s")
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Accuracy and throughput of the two-stage cascade on held-out CICIDS data")
+    parser.add_argument("csv", help="Labelled CICIDS CSV")
+    parser.add_argument("--pipeline", default=os.path.join(APP_DIR, "main_pipeline.pkl"))
+    parser.add_argument("--test-size", type=float, default=0.3)
+    parser.add_argument("--target-recall", type=float, default=CASCADE_TARGET_RECALL)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    main_pipeline = joblib.load(args.pipeline)
+    main_pipeline.disable_cascade()
+
+    data = pd.read_csv(args.csv)
+    data.columns = data.columns.str.strip()
+    X = main_pipeline.cleaning_pipeline.transform_with_index(data)
+    y = map_attack_types(data["Label"].iloc[X.index]).to_numpy()
+    known = np.isin(y, main_pipeline.model_pipeline.classes_)
+    X, y = X[known], y[known]
+
+    X_fit, X_test, y_fit, y_test = train_test_split(X, y, test_size=args.test_size, stratify=y, random_state=0)
+    X_fit, X_val, y_fit, y_val = train_test_split(X_fit, y_fit, test_size=0.2, stratify=y_fit, random_state=0)
+    print(f"{len(X_fit)} rows to fit the cascade, {len(X_val)} to pick the threshold, {len(X_test)} held out")
+
+    full_predictions, full_rate = rows_per_second(main_pipeline, X_test, args.repeats)
+
+    cascade_model = fit_cascade(X_fit, y_fit)
+    threshold = choose_threshold(cascade_model, X_val, y_val, args.target_recall)
+    if threshold is None:
+        report("full", y_test, full_predictions, full_rate)
+        return
+    main_pipeline.enable_cascade(cascade_model, threshold)
+    cascade_predictions, cascade_rate = rows_per_second(main_pipeline, X_test, args.repeats)
+
+    forwarded = (main_pipeline._cascade_score(X_test) >= threshold).mean()
+    print(f"threshold {threshold:.4f}, {forwarded:.2%} of held-out rows forwarded to the full model")
+    report("full", y_test, full_predictions, full_rate)
+    report("cascade", y_test, cascade_predictions, cascade_rate)
+    print(f"agreement with full model {np.mean(np.asarray(cascade_predictions) == np.asarray(full_predictions)):.4%}, speedup {cascade_rate / full_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
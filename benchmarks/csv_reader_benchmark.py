@@ -0,0 +1,77 @@
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+from data_cleaning_pipeline import DataCleaningPipeline
+from flow_reader import read_flow_csv, read_flow_file
+
+
+def peak_rss_mb() -> float:
+    
+    # VmHWM belongs to this address space, ru_maxrss would carry the parent's peak across exec
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def parse(variant, source_path, results):
+
+    final_features = DataCleaningPipeline().final_features
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if variant == "default":
+        data = pd.read_csv(source_path)
+    elif variant in ("parquet", "arrow"):
+        data, _ = read_flow_file(source_path, final_features)
+    else:
+        data, _ = read_flow_csv(source_path, final_features, engine=variant)
+    elapsed = time.perf_counter() - start
+    results.put((variant, elapsed, data.shape, data.memory_usage(deep=True).sum() / 1e6, peak_rss_mb() - baseline))
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Parse time and memory of the flow reader against a plain pd.read_csv")
+    parser.add_argument("csv", help="CICFlowMeter CSV")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.csv}: {os.path.getsize(args.csv) / 1e6:.1f} MB")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # the same flows as columnar exports
+        frame = pd.read_csv(args.csv)
+        sources = {"default": args.csv, "c": args.csv, "pyarrow": args.csv,
+                   "parquet": os.path.join(tmp_dir, "flows.parquet"), "arrow": os.path.join(tmp_dir, "flows.arrow")}
+        frame.to_parquet(sources["parquet"])
+        frame.to_feather(sources["arrow"])
+        del frame
+        
+        # every run gets a fresh process so peak RSS is not shared between variants
+        context = multiprocessing.get_context("spawn")
+        for variant, source in sources.items():
+            runs = []
+            for _ in range(args.repeats):
+                results = context.Queue()
+                worker = context.Process(target=parse, args=(variant, source, results))
+                worker.start()
+                runs.append(results.get())
+                worker.join()
+            name, elapsed, shape, frame_mb, rss_mb = min(runs, key=lambda run: run[1])
+            label = "pd.read_csv" if name == "default" else f"flow reader ({name})"
+            print(f"{label:>22}: {elapsed:.3f}s  {shape[0]} rows x {shape[1]} cols  frame {frame_mb:.1f} MB  peak RSS +{rss_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, insert
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.db_config import create_configured_engine, is_sqlite
+
+
+metadata = MetaData()
+bench_logs = Table(
+    "bench_traffic_logs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("workspace_id", Integer, index=True),
+    Column("timestamp", DateTime),
+    Column("source_ip", String),
+    Column("destination_ip", String),
+    Column("protocol", String),
+    Column("status", String),
+)
+
+
+def make_engine(url, tuned):
+
+    if tuned:
+        return create_configured_engine(url)
+    if is_sqlite(url):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
+def writer(args):
+
+    url, tuned, writer_id, batches, batch_size = args
+    engine = make_engine(url, tuned)
+    rows = [
+        {
+            "workspace_id": writer_id,
+            "source_ip": f"10.0.{writer_id}.{i % 255}",
+            "destination_ip": f"192.168.0.{i % 255}",
+            "protocol": "6",
+            "status": "BENIGN" if i % 7 else "DoS",
+        }
+        for i in range(batch_size)
+    ]
+    written = 0
+    locked = 0
+    for _ in range(batches):
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(bench_logs), rows)
+            written += batch_size
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+    engine.dispose()
+    return written, locked
+
+def run(url, tuned, writers, batches, batch_size):
+
+    engine = make_engine(url, tuned)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    engine.dispose()
+
+    start = time.perf_counter()
+    with Pool(writers) as pool:
+        results = pool.map(writer, [(url, tuned, i, batches, batch_size) for i in range(writers)])
+    elapsed = time.perf_counter() - start
+
+    written = sum(r[0] for r in results)
+    locked = sum(r[1] for r in results)
+    label = "tuned" if tuned else "default"
+    print(f"{label:>8}: {written} rows in {elapsed:.2f}s -> {written / elapsed:,.0f} rows/s, {locked} 'database is locked' failures")
+
+    engine = make_engine(url, tuned)
+    metadata.drop_all(engine)
+    engine.dispose()
+    return written / elapsed
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Concurrent write throughput of the traffic log store")
+    parser.add_argument("--url", help="Database URL (default: a temporary SQLite file)")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writer processes")
+    parser.add_argument("--batches", type=int, default=50, help="Commits per writer")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per commit")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per profile, the median is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.url:
+            url = args.url
+        else:
+            url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+        print(f"Database: {url}")
+        print(f"{args.writers} writers x {args.batches} commits x {args.batch_size} rows")
+
+        # journal_mode is persistent, so the tuned runs use their own file
+        tuned_url = url if args.url else f"sqlite:///{os.path.join(tmp_dir, 'bench_tuned.db')}"
+        profiles = [(url, False), (tuned_url, True)] if is_sqlite(url) else [(url, True)]
+        rates = {tuned: [] for _, tuned in profiles}
+        # the profiles take turns, so a noisy neighbour slows both alike
+        for _ in range(args.repeat):
+            for profile_url, tuned in profiles:
+                rates[tuned].append(run(profile_url, tuned, args.writers, args.batches, args.batch_size))
+        for tuned, values in rates.items():
+            print(f"median {'tuned' if tuned else 'default'}: {statistics.median(values):,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+sys.path.insert(0, APP_DIR)
+
+
+def synthetic_flows(final_features, rows, seed=0):
+
+    # same dtypes the flow reader produces: float32 features plus the text identity columns
+    # with the repeated flows and NaN/Infinity rates CICIDS exports carry
+    rng = np.random.default_rng(seed)
+    features = rng.gamma(2.0, 500.0, size=(rows, len(final_features))).astype(np.float32)
+    repeated = rng.random(rows) < 0.05
+    features[repeated] = features[rng.integers(0, rows, int(repeated.sum()))]
+    broken = rng.random(rows) < 0.002
+    features[broken, rng.integers(0, len(final_features), int(broken.sum()))] = rng.choice([np.nan, np.inf], int(broken.sum()))
+    data = pd.DataFrame(features, columns=final_features)
+    data["Source IP"] = rng.integers(0, 4096, rows).astype(str)
+    data["Destination IP"] = rng.integers(0, 4096, rows).astype(str)
+    data.loc[repeated, ["Source IP", "Destination IP"]] = "10.0.0.1"
+    return data
+
+def dataframe_path(main_pipeline, data):
+
+    cleaned_data = main_pipeline.cleaning_pipeline.transform_with_index(data)
+    return main_pipeline.model_pipeline.predict_proba(cleaned_data)
+
+def array_path(main_pipeline, data):
+
+    return main_pipeline.transform_and_predict(data, return_proba=True)
+
+def measure(name, path, main_pipeline, data, rows):
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    path(main_pipeline, data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_million = peak / 1e6 * 1_000_000 / rows
+    print(f"{name:>16}: peak {peak / 1e6:,.1f} MB ({per_million:,.1f} MB per 1M rows)  {elapsed:.2f}s")
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Peak memory of cleaning + scoring with a DataFrame vs the float32 feature matrix")
+    parser.add_argument("--pipeline", default=os.path.join(APP_DIR, "main_pipeline.pkl"))
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    main_pipeline = joblib.load(args.pipeline)
+    main_pipeline.disable_cascade()
+    final_features = main_pipeline.cleaning_pipeline.final_features
+    print(f"{args.rows:,} rows x {len(final_features)} features")
+    # every path gets its own copy so in-place cleaning steps don't leak between runs
+    measure("DataFrame", dataframe_path, main_pipeline, synthetic_flows(final_features, args.rows), args.rows)
+    measure("float32 matrix", array_path, main_pipeline, synthetic_flows(final_features, args.rows), args.rows)
+
+
+if __name__ == "__main__":
+    main()
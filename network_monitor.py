@@ -14,8 +14,18 @@ from pathlib import Path
 API_BASE_URL = "http://localhost:8000"
 LOGIN_ENDPOINT = f"{API_BASE_URL}/api/login"
 PROCESS_ENDPOINT = f"{API_BASE_URL}/api/direct-process"
+JOBS_ENDPOINT = f"{API_BASE_URL}/api/jobs"
 DEFAULT_CHECK_INTERVAL = 10  
 DEFAULT_REQUEST_TIMEOUT = 60  
+JOB_POLL_INTERVAL = 2
+# the server keeps scoring a job either way, this only bounds how long the monitor waits for it
+JOB_WAIT_TIMEOUT = 6 * 60 * 60
+# columnar exports are uploaded as raw bytes instead of JSON text
+COLUMNAR_CONTENT_TYPES = {
+    '.parquet': 'application/vnd.apache.parquet',
+    '.arrow': 'application/vnd.apache.arrow.file',
+}
+FLOW_FILE_EXTENSIONS = ('.csv',) + tuple(COLUMNAR_CONTENT_TYPES)
 
 
 def get_script_directory():
@@ -71,6 +81,10 @@ def authenticate_user():
                     print("✗ Authentication failed: No API key received")
             elif response.status_code == 401:
                 print("✗ Authentication failed: Invalid username or password")
+            elif response.status_code == 429:
+                retry_after = int(response.headers.get("Retry-After", "60"))
+                print(f"✗ Too many login attempts, waiting {retry_after} seconds...")
+                time.sleep(retry_after)
             else:
                 print(f"✗ Authentication failed: Server error ({response.status_code})")
                 
@@ -374,9 +388,9 @@ def display_header():
     print(f"- CSV Directory: {CSV_DIR}")
     print("\nInstructions:")
     if CSV_DIR == SCRIPT_DIR:
-        print("1. Place CSV files in the same directory as this program to process them.")
+        print("1. Place CSV, Parquet or Arrow files in the same directory as this program to process them.")
     else:
-        print(f"1. Place CSV files in the {os.path.basename(CSV_DIR)} directory to process them.")
+        print(f"1. Place CSV, Parquet or Arrow files in the {os.path.basename(CSV_DIR)} directory to process them.")
     print("2. Processed files will be moved to the 'processed' directory.")
     print("3. Failed files will be moved to the 'failed' directory.")
     print("4. Check 'logs/monitor.log' for detailed processing information.")
@@ -389,6 +403,89 @@ def display_header():
     logger.info(f"Check Interval: {CHECK_INTERVAL} seconds")
     logger.info(f"CSV Directory: {CSV_DIR}")
 
+def post_flow_file(endpoint, file_path):
+    
+    content_type = COLUMNAR_CONTENT_TYPES.get(os.path.splitext(file_path)[1].lower())
+    if content_type:
+        with open(file_path, 'rb') as f:
+            return requests.post(
+                endpoint,
+                data=f,
+                params={'workspace_id': WORKSPACE_ID},
+                headers={'X-API-Key': API_KEY, 'Content-Type': content_type},
+                timeout=DEFAULT_REQUEST_TIMEOUT
+            )
+    
+    with open(file_path, 'r') as f:
+        csv_content = f.read()
+
+    headers = {
+        'X-API-Key': API_KEY,
+        'Content-Type': 'application/json'
+    }
+    
+    payload = {
+        'csv_text': csv_content,
+        'workspace_id': WORKSPACE_ID
+    }
+
+    return requests.post(
+        endpoint, 
+        json=payload, 
+        headers=headers, 
+        timeout=DEFAULT_REQUEST_TIMEOUT
+    )
+
+def retry_delay(response):
+    
+    retry_after = response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return min(int(retry_after), JOB_WAIT_TIMEOUT)
+    return JOB_POLL_INTERVAL
+
+def wait_for_job(job_id):
+    
+    # the upload is already on the server, so a slow or dropped poll is retried instead of failing the file
+    deadline = time.monotonic() + JOB_WAIT_TIMEOUT
+    last_progress = None
+    while time.monotonic() < deadline:
+        try:
+            response = requests.get(
+                f"{JOBS_ENDPOINT}/{job_id}",
+                headers={'X-API-Key': API_KEY},
+                timeout=DEFAULT_REQUEST_TIMEOUT
+            )
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Polling job {job_id} failed, retrying: {str(e)}")
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            # overloaded or restarting, the job itself is still queued or running on the server
+            delay = retry_delay(response)
+            logger.warning(f"Polling job {job_id} returned {response.status_code}, retrying in {delay} seconds")
+            time.sleep(delay)
+            continue
+        if response.status_code != 200:
+            return None, f"API error {response.status_code}: {response.text}"
+        job = response.json()
+        if job['status'] in ('done', 'failed'):
+            return job, None
+        
+        progress = job.get('progress') or {}
+        if progress != last_progress:
+            logger.info(f"Job {job_id} {job['status']}: {progress.get('parsed') or 0} rows parsed, "
+                        f"{progress.get('cleaned') or 0} cleaned, {progress.get('scored') or 0} scored")
+            last_progress = progress
+        time.sleep(JOB_POLL_INTERVAL)
+    return None, f"Gave up waiting for job {job_id} after {JOB_WAIT_TIMEOUT} seconds"
+
+def move_to_processed(file_path):
+    
+    processed_path = os.path.join(PROCESSED_DIR, os.path.basename(file_path))
+    shutil.move(file_path, processed_path)
+    logger.info(f"Moved processed file to: {processed_path}")
+
 def send_csv_file(file_path):
     
     logger.info(f"Processing file: {file_path}")
@@ -398,54 +495,33 @@ def send_csv_file(file_path):
         file_size = os.path.getsize(file_path)
         logger.info(f"File size: {file_size} bytes")
         
-        with open(file_path, 'r') as f:
-            csv_content = f.read()
-
-        headers = {
-            'X-API-Key': API_KEY,
-            'Content-Type': 'application/json'
-        }
+        # submit and poll, so big files are no longer bound by the request timeout
+        response = post_flow_file(JOBS_ENDPOINT, file_path)
+        if response.status_code == 404 and response.json().get('detail') == 'Not Found':
+            logger.info("Server has no job API, sending the file for direct processing")
+            return send_direct(file_path)
+        if response.status_code != 202:
+            logger.error(f"Failed to submit file. Status code: {response.status_code}")
+            logger.error(f"Response: {response.text}")
+            return False, f"API error {response.status_code}: {response.text}"
         
-        payload = {
-            'csv_text': csv_content,
-            'workspace_id': WORKSPACE_ID
-        }
-
-        response = requests.post(
-            PROCESS_ENDPOINT, 
-            json=payload, 
-            headers=headers, 
-            timeout=DEFAULT_REQUEST_TIMEOUT
-        )
+        job_id = response.json()['job_id']
+        logger.info(f"Submitted as job {job_id}")
+        job, error = wait_for_job(job_id)
+        if job is None:
+            logger.error(error)
+            return False, error
+        if job['status'] == 'failed':
+            logger.error(f"Job {job_id} failed: {job.get('error')}")
+            return False, f"Job failed: {job.get('error')}"
         
-        if response.status_code == 200:
-            try:
-                response_data = response.json()
-                
-                if 'predictions' in response_data and len(response_data['predictions']) > 0:
-                    pred_counts = {}
-                    for pred in response_data['predictions']:
-                        if pred in pred_counts:
-                            pred_counts[pred] += 1
-                        else:
-                            pred_counts[pred] = 1
-                    logger.info(f"Processing complete. Prediction summary: {pred_counts}")
-                else:
-                    logger.info("File processed successfully")
-                
-                
-                processed_path = os.path.join(PROCESSED_DIR, os.path.basename(file_path))
-                shutil.move(file_path, processed_path)
-                logger.info(f"Moved processed file to: {processed_path}")
-                
-                return True, response_data.get('message', 'Success')
-            except Exception as e:
-                logger.error(f"Error parsing response: {str(e)}")
-                return False, f"Error parsing response: {str(e)}"
+        summary = job.get('summary') or {}
+        if summary.get('counts'):
+            logger.info(f"Processing complete. Prediction summary: {summary['counts']}")
         else:
-            logger.error(f"Failed to send file. Status code: {response.status_code}")
-            logger.error(f"Response: {response.text}")
-            return False, f"API error {response.status_code}: {response.text}"
+            logger.info("File processed successfully")
+        move_to_processed(file_path)
+        return True, summary.get('message', 'Success')
             
     except requests.exceptions.Timeout:
         logger.error(f"Request timed out after {DEFAULT_REQUEST_TIMEOUT} seconds")
@@ -457,10 +533,39 @@ def send_csv_file(file_path):
         logger.error(f"Error processing file: {str(e)}")
         return False, f"Error: {str(e)}"
 
+def send_direct(file_path):
+    
+    response = post_flow_file(PROCESS_ENDPOINT, file_path)
+    if response.status_code == 200:
+        try:
+            response_data = response.json()
+            
+            if 'predictions' in response_data and len(response_data['predictions']) > 0:
+                pred_counts = {}
+                for pred in response_data['predictions']:
+                    if pred in pred_counts:
+                        pred_counts[pred] += 1
+                    else:
+                        pred_counts[pred] = 1
+                logger.info(f"Processing complete. Prediction summary: {pred_counts}")
+            else:
+                logger.info("File processed successfully")
+            
+            
+            move_to_processed(file_path)
+            return True, response_data.get('message', 'Success')
+        except Exception as e:
+            logger.error(f"Error parsing response: {str(e)}")
+            return False, f"Error parsing response: {str(e)}"
+    else:
+        logger.error(f"Failed to send file. Status code: {response.status_code}")
+        logger.error(f"Response: {response.text}")
+        return False, f"API error {response.status_code}: {response.text}"
+
 def process_csv_directory():
     
-    csv_files = [f for f in os.listdir(CSV_DIR) if f.lower().endswith('.csv')]
-    logger.info(f"Found {len(csv_files)} CSV files to process.")
+    csv_files = [f for f in os.listdir(CSV_DIR) if f.lower().endswith(FLOW_FILE_EXTENSIONS)]
+    logger.info(f"Found {len(csv_files)} flow files to process.")
     
     if not csv_files:
         return
@@ -488,7 +593,7 @@ def main():
     
     try:
         while True:
-            logger.info("Checking for CSV files...")
+            logger.info("Checking for flow files...")
             process_csv_directory()
             
             